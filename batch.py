@@ -0,0 +1,182 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import argparse
+import csv
+import multiprocessing
+import random
+
+
+from game_config import STEP_TIME, BALL_VELOCITY_X, BALL_VELOCITY_Y, PADDLE_WIDTH, BALL_WIDTH
+from headless import Simulation
+
+
+# Simulation of the worker process, built once by init_worker() and reused by every game
+simulation = None
+
+
+class Autopilot(object):
+    """
+    Scripted paddle: follows the ball aiming at a random point of the paddle, which changes
+    after every bounce, and only reacts every reaction_ms. Launches the ball after a random
+    delay. Deterministic for a given seed
+    """
+    def __init__(self, seed, reaction_ms=30, max_launch_delay=2000):
+        self.random = random.Random(seed)
+        self.reaction_ms = reaction_ms
+        self.launch_time = self.random.uniform(0, max_launch_delay)
+        self.aim = 0.0
+        self.bounces = 0
+        self.next_reaction = 0
+        self.inputs = []
+
+    def get_inputs(self, state, stats):
+        if state['time'] < self.next_reaction:
+            return self.inputs
+        self.next_reaction = state['time'] + self.reaction_ms
+        if stats['paddle_bounces'] != self.bounces:
+            self.bounces = stats['paddle_bounces']
+            self.aim = self.random.uniform(-0.45, 0.45)
+
+        self.inputs = []
+        if state['time'] >= self.launch_time:
+            self.inputs.append(Simulation.LAUNCH)
+        ball_x = state['balls'][0][0] + BALL_WIDTH * 0.5
+        target_x = ball_x - PADDLE_WIDTH * (0.5 + self.aim)
+        paddle_x = state['paddle'][0][0]
+        if target_x < paddle_x - 4:
+            self.inputs.append(Simulation.LEFT)
+        elif target_x > paddle_x + 4:
+            self.inputs.append(Simulation.RIGHT)
+        return self.inputs
+
+
+def init_worker(ball_velocity):
+    global simulation
+    simulation = Simulation()
+    simulation.layer.ball_velocity.set(ball_velocity[0], ball_velocity[1])
+
+
+def play_game(task):
+    """
+    Plays one game on a map until the map is cleared, every life is lost or max_ms
+    elapses. Returns the metrics of the game
+    """
+    game, map_index, seed, lives, max_ms = task
+    layer = simulation.layer
+    state = simulation.start_map(map_index)
+    autopilot = Autopilot(seed)
+    lives_left = lives
+    cleared = False
+    while state['time'] < max_ms:
+        state = simulation.step(autopilot.get_inputs(state, layer.stats), STEP_TIME)
+        if state['map'] != map_index or state['status'] == layer.GAME_WIN_SCREEN:
+            cleared = True
+            break
+        if state['status'] == layer.GAME_EXIT:
+            lives_left -= 1
+            if lives_left == 0:
+                break
+            layer.serve_balls()
+
+    minutes = state['time'] / 60000.0
+    return {'game': game,
+            'map': map_index,
+            'seed': seed,
+            'cleared': int(cleared),
+            'time_ms': state['time'],
+            'balls_lost': layer.stats['balls_lost'],
+            'paddle_bounces': layer.stats['paddle_bounces'],
+            'bricks_hit': layer.stats['bricks_hit'],
+            'bricks_hit_per_minute': layer.stats['bricks_hit'] / minutes if minutes > 0 else 0.0}
+
+
+def summarize(results):
+    """
+    Aggregates the game metrics per map
+    """
+    maps = {}
+    for r in results:
+        maps.setdefault(r['map'], []).append(r)
+    summary = []
+    for map_index in sorted(maps):
+        games = maps[map_index]
+        cleared = [g for g in games if g['cleared']]
+        count = float(len(games))
+        summary.append({'map': map_index,
+                        'games': len(games),
+                        'clear_rate': len(cleared) / count,
+                        'mean_clear_time_ms': sum(g['time_ms'] for g in cleared) / len(cleared) if cleared else '',
+                        'mean_balls_lost': sum(g['balls_lost'] for g in games) / count,
+                        'mean_paddle_bounces': sum(g['paddle_bounces'] for g in games) / count,
+                        'mean_bricks_hit_per_minute': sum(g['bricks_hit_per_minute'] for g in games) / count})
+    return summary
+
+
+def write_csv(file_name, rows):
+    with open(file_name, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_batch(games, maps, seed=0, lives=3, max_ms=600000, processes=None,
+              ball_velocity=(BALL_VELOCITY_X, BALL_VELOCITY_Y)):
+    """
+    Plays games games on each of the given maps across a process pool. Returns the
+    metrics of every game
+    """
+    seeds = random.Random(seed)
+    tasks = [(i, m, seeds.randint(0, 2 ** 31), lives, max_ms)
+             for m in maps for i in range(games)]
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes, init_worker, (ball_velocity,))
+    try:
+        results = pool.map(play_game, tasks, max(1, len(tasks) // (8 * processes)))
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays simulated games without a window and reports metrics per map')
+    parser.add_argument('--games', type=int, default=100, help='games per map')
+    parser.add_argument('--maps', type=int, nargs='*', help='map indices (default: every map)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lives', type=int, default=3)
+    parser.add_argument('--max-time', type=int, default=600000, help='maximum simulated ms per game')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--ball-velocity', type=float, nargs=2, default=(BALL_VELOCITY_X, BALL_VELOCITY_Y))
+    parser.add_argument('--output', default='games.csv', help='per game metrics')
+    parser.add_argument('--summary', default='summary.csv', help='per map metrics')
+    args = parser.parse_args()
+
+    maps = args.maps
+    if not maps:
+        # The maps of the level pack when LEVEL_PACK is set, as the workers play them
+        maps = list(range(Simulation().layer.current_map.get_map_count()))
+    results = run_batch(args.games, maps, args.seed, args.lives, args.max_time, args.processes,
+                        args.ball_velocity)
+    results.sort(key=lambda r: (r['map'], r['game']))
+    write_csv(args.output, results)
+    write_csv(args.summary, summarize(results))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+"""
+Throughput benchmarks of the physics and the rendering of the game. Run them from the
+game directory with:
+
+    python -m benchmarks.run --output results.json [--baseline baseline.json]
+
+See benchmarks/run.py for the options
+"""
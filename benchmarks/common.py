@@ -0,0 +1,58 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import time
+
+
+# Highest resolution wall clock available, in seconds
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class Benchmark(object):
+    """
+    Named benchmark: func performs ops_per_call operations of the given unit on each call.
+    setup, if given, is called once before measuring and gets func's argument
+    """
+    def __init__(self, name, func, unit, ops_per_call=1, setup=None):
+        self.name = name
+        self.func = func
+        self.unit = unit
+        self.ops_per_call = ops_per_call
+        self.setup = setup
+
+
+def measure(benchmark, min_time=0.3, repeat=3):
+    """
+    Calls the benchmark repeatedly for at least min_time s, repeat times. Gets the best
+    rate of operations per second, which is the least disturbed by the rest of the system
+    """
+    state = benchmark.setup() if benchmark.setup is not None else None
+    func = benchmark.func
+    best = 0.0
+    for i in range(repeat):
+        calls = 0
+        start = timer()
+        while True:
+            func(state)
+            calls += 1
+            elapsed = timer() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, calls * benchmark.ops_per_call / elapsed)
+    return best
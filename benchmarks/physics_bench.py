@@ -0,0 +1,167 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import math
+import random
+
+
+import physics
+from vector import ZERO2, Vector2
+from game_config import WINDOW_WIDTH, WINDOW_HEIGHT, WALL_WIDTH, WALL_HEIGHT, BALL_WIDTH, BALL_HEIGHT,\
+                        BALL_VELOCITY_X, BALL_VELOCITY_Y, BRICK_WIDTH, BRICK_HEIGHT, BRICK_SPACING,\
+                        STEP_TIME_INTEGRATE
+from benchmarks.common import Benchmark
+
+
+BRICK_TOP = 60 # Top of the first brick row (pixels)
+SUBSTEPS_PER_CALL = 10
+MICRO_CALLS = 1000
+
+
+def make_world(balls=1, rows=6, density=1.0, broadphase='adaptive', seed=0, ball_collisions=True):
+    """
+    Builds a physics world like the game's: the four walls, rows of bricks laid on a lattice
+    across the window (each lattice cell holds a brick with probability density) and balls
+    moving in random directions below the bricks. Bricks are never destroyed, so the world
+    stays in the same state however long it is simulated. broadphase is 'adaptive' (the
+    game's), 'hash', 'brute' or 'numpy' (the NumPy backend, see physics_numpy.py)
+    """
+    rng = random.Random(seed)
+    if broadphase == 'numpy':
+        import physics_numpy # NumPy is only required by this backend
+        world = physics_numpy.ArrayPhysicsWorld(STEP_TIME_INTEGRATE, ball_collisions, BRICK_WIDTH, BRICK_HEIGHT)
+    elif broadphase == 'adaptive':
+        world = physics.PhysicsWorld(STEP_TIME_INTEGRATE,
+                                     physics.AdaptiveBroadphase(BRICK_WIDTH, BRICK_HEIGHT))
+    elif broadphase == 'hash':
+        world = physics.PhysicsWorld(STEP_TIME_INTEGRATE,
+                                     physics.SpatialHashBroadphase(BRICK_WIDTH, BRICK_HEIGHT))
+    else:
+        world = physics.PhysicsWorld(STEP_TIME_INTEGRATE, physics.BruteForceBroadphase())
+    world.dynamic_collisions = ball_collisions
+    world.add_callback(world.CallBack('ball', 'brick', lambda ball, brick, normal: None))
+
+    for name, x, y, w, h in (('top-wall', 0.0, -WALL_HEIGHT, WINDOW_WIDTH, WALL_HEIGHT),
+                             ('bottom-wall', 0.0, WINDOW_HEIGHT, WINDOW_WIDTH, WALL_HEIGHT),
+                             ('left-wall', -WALL_WIDTH, -WALL_HEIGHT, WALL_WIDTH, WINDOW_HEIGHT + 2 * WALL_HEIGHT),
+                             ('right-wall', WINDOW_WIDTH, -WALL_HEIGHT, WALL_WIDTH, WINDOW_HEIGHT + 2 * WALL_HEIGHT)):
+        world.add_body(physics.Body(physics.Rect(Vector2(x, y), w, h), ZERO2, name, None, True))
+
+    pitch_x = BRICK_WIDTH + BRICK_SPACING
+    pitch_y = BRICK_HEIGHT + BRICK_SPACING
+    origin = Vector2(BRICK_SPACING, BRICK_TOP)
+    world.set_lattice(physics.LatticeIndex(origin, pitch_x, pitch_y, 'brick'))
+    columns = int((WINDOW_WIDTH - BRICK_SPACING) // pitch_x)
+    for y in range(rows):
+        for x in range(columns):
+            if rng.random() < density:
+                world.add_body(physics.Body(physics.Rect(Vector2(origin.x + x * pitch_x, origin.y + y * pitch_y),
+                                                         BRICK_WIDTH, BRICK_HEIGHT),
+                                            ZERO2, 'brick', None, True))
+
+    speed = math.hypot(BALL_VELOCITY_X, BALL_VELOCITY_Y)
+    balls_top = BRICK_TOP + rows * pitch_y
+    for i in range(balls):
+        angle = rng.uniform(0.0, 2.0 * math.pi)
+        position = Vector2(rng.uniform(0.0, WINDOW_WIDTH - BALL_WIDTH),
+                           rng.uniform(balls_top, WINDOW_HEIGHT - BALL_HEIGHT))
+        world.add_body(physics.Body(physics.Rect(position, BALL_WIDTH, BALL_HEIGHT),
+                                    Vector2(math.cos(angle) * speed, math.sin(angle) * speed),
+                                    'ball', None, False))
+    return world
+
+
+def numpy_available():
+    try:
+        import numpy
+    except ImportError:
+        return False
+    return True
+
+
+def substeps_benchmark(name, **world_args):
+    def step(world):
+        world.step_simulation(SUBSTEPS_PER_CALL * world.step_ms)
+    return Benchmark(name, step, 'substeps/s', SUBSTEPS_PER_CALL, lambda: make_world(**world_args))
+
+
+def micro_setup():
+    """
+    A dynamic ball overlapping the right half of the bottom of a static brick
+    """
+    world = physics.PhysicsWorld(STEP_TIME_INTEGRATE)
+    brick = physics.Body(physics.Rect(Vector2(100.0, 100.0), BRICK_WIDTH, BRICK_HEIGHT), ZERO2, 'brick', None, True)
+    ball = physics.Body(physics.Rect(Vector2(110.0, 100.0 + BRICK_HEIGHT - 2.0), BALL_WIDTH, BALL_HEIGHT),
+                        Vector2(BALL_VELOCITY_X, -BALL_VELOCITY_Y), 'ball', None, False)
+    return world, ball, brick
+
+
+def bench_collide(state):
+    world, ball, brick = state
+    for i in range(MICRO_CALLS):
+        world.collide(ball, brick)
+
+
+def bench_calculate_normal(state):
+    world, ball, brick = state
+    for i in range(MICRO_CALLS):
+        world.calculate_normal(ball, brick)
+
+
+def bench_solve_collision(state):
+    # The ball is put back into the brick before each call, so every call solves a contact
+    world, ball, brick = state
+    position = ball.rect.position
+    direction = ball.direction
+    for i in range(MICRO_CALLS):
+        position.set(110.0, 100.0 + BRICK_HEIGHT - 2.0)
+        direction.set(0.6, -0.8)
+        world.solve_collision(ball, brick)
+
+
+def benchmarks():
+    """
+    Gets the physics benchmarks: substeps per second of whole worlds as the ball count,
+    the brick rows and the brick density grow, and calls per second of the narrow phase.
+    The multiball ones are the stress test of the multiball mode, up to its ball cap, also
+    run on the NumPy backend when NumPy is installed
+    """
+    result = []
+    for balls in (1, 4, 16, 64):
+        result.append(substeps_benchmark('physics.substeps.balls-%d' % balls, balls=balls))
+    for balls in (100, 500):
+        result.append(substeps_benchmark('physics.substeps.multiball-%d' % balls, balls=balls,
+                                         ball_collisions=False))
+    result.append(substeps_benchmark('physics.substeps.multiball-500-ball-collisions', balls=500))
+    if numpy_available():
+        for balls in (100, 500):
+            result.append(substeps_benchmark('physics.substeps.multiball-%d-numpy' % balls, balls=balls,
+                                             broadphase='numpy', ball_collisions=False))
+        result.append(substeps_benchmark('physics.substeps.multiball-500-ball-collisions-numpy', balls=500,
+                                         broadphase='numpy'))
+    for rows in (6, 12, 24):
+        result.append(substeps_benchmark('physics.substeps.rows-%d' % rows, rows=rows))
+    for density in (0.25, 0.5):
+        result.append(substeps_benchmark('physics.substeps.rows-12-density-%g' % density, rows=12, density=density))
+    result.append(substeps_benchmark('physics.substeps.rows-12-bruteforce', rows=12, broadphase='brute'))
+    result.append(substeps_benchmark('physics.substeps.rows-12-spatialhash', rows=12, broadphase='hash'))
+    result.append(Benchmark('physics.collide', bench_collide, 'calls/s', MICRO_CALLS, micro_setup))
+    result.append(Benchmark('physics.calculate_normal', bench_calculate_normal, 'calls/s', MICRO_CALLS, micro_setup))
+    result.append(Benchmark('physics.solve_collision', bench_solve_collision, 'calls/s', MICRO_CALLS, micro_setup))
+    return result
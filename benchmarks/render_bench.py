@@ -0,0 +1,80 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import pygame
+
+
+import headless
+
+
+from game_config import WINDOW_WIDTH, WINDOW_HEIGHT, BALL_WIDTH, PADDLE_WIDTH
+from benchmarks.common import Benchmark
+
+
+class Scene(object):
+    """
+    Game layer of a headless simulation on the first map, whose ball and paddle move a
+    little every frame, so each frame has something to redraw
+    """
+    def __init__(self):
+        # Created first, so that the display uses its video driver
+        self.simulation = headless.Simulation()
+        pygame.init()
+        self.simulation.reset()
+        self.layer = self.simulation.layer
+        self.layer.drawn_rects = {}
+        self.surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.frame = 0
+
+    def move(self):
+        self.frame += 1
+        ball = self.layer.balls[0].body.rect.position
+        paddle = self.layer.paddles[0].body.rect.position
+        ball.x = (self.frame * 3) % (WINDOW_WIDTH - BALL_WIDTH)
+        paddle.x = (self.frame * 2) % (WINDOW_WIDTH - PADDLE_WIDTH)
+
+
+def bench_render(scene):
+    scene.move()
+    scene.layer.render()
+
+
+def bench_render_dirty(scene):
+    scene.move()
+    scene.layer.render_dirty()
+
+
+def bench_draw_scene(scene):
+    scene.move()
+    scene.layer.draw_scene(scene.surface)
+
+
+def bench_build_brick_layer(scene):
+    scene.layer.build_brick_layer()
+
+
+def benchmarks():
+    """
+    Gets the rendering benchmarks: frames per second of the game layer draw paths, on the
+    display of the dummy video driver or on an off-screen surface
+    """
+    return [Benchmark('render.full', bench_render, 'frames/s', 1, Scene),
+            Benchmark('render.dirty', bench_render_dirty, 'frames/s', 1, Scene),
+            Benchmark('render.draw_scene_offscreen', bench_draw_scene, 'frames/s', 1, Scene),
+            Benchmark('render.build_brick_layer', bench_build_brick_layer, 'calls/s', 1, Scene)]
@@ -0,0 +1,102 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+
+import pygame
+
+
+from benchmarks import physics_bench, render_bench
+from benchmarks.common import measure
+
+
+def run_benchmarks(names=None, min_time=0.3, repeat=3):
+    """
+    Runs the benchmarks whose name starts with one of names (default: all of them).
+    Gets the results: name -> {'rate': operations per second, 'unit': unit}
+    """
+    results = {}
+    for benchmark in physics_bench.benchmarks() + render_bench.benchmarks():
+        if names and not any(benchmark.name.startswith(name) for name in names):
+            continue
+        rate = measure(benchmark, min_time, repeat)
+        results[benchmark.name] = {'rate': rate, 'unit': benchmark.unit}
+        print('%-52s %14.1f %s' % (benchmark.name, rate, benchmark.unit))
+        sys.stdout.flush()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with the baseline results of the same benchmarks. Gets the
+    (name, baseline rate, rate, change) of the benchmarks slower than the baseline by
+    more than the threshold fraction
+    """
+    regressions = []
+    print('\n%-52s %14s %14s %8s' % ('benchmark', 'baseline', 'current', 'change'))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        base_rate = baseline[name]['rate']
+        rate = results[name]['rate']
+        change = rate / base_rate - 1.0
+        flag = ''
+        if change < -threshold:
+            flag = ' REGRESSION'
+            regressions.append((name, base_rate, rate, change))
+        print('%-52s %14.1f %14.1f %+7.1f%%%s' % (name, base_rate, rate, change * 100.0, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the physics and rendering throughput of the game')
+    parser.add_argument('names', nargs='*', help='run only the benchmarks starting with these names')
+    parser.add_argument('--min-time', type=float, default=0.3, help='seconds measured per repetition')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions, the best one is kept')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown fraction reported as a regression (default: 0.1)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.names, args.min_time, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'pygame': pygame.version.ver,
+                       'platform': platform.platform(),
+                       'results': results}, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('\n%d benchmark(s) slower than the baseline by more than %g%%' %
+                  (len(regressions), args.threshold * 100.0))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -16,45 +16,86 @@
   Boston, MA 02110-1301, USA.
 '''
 
+import threading
+
+
 import pygame
 
 
 from physics import Body, Rect
+from utils import IndexedList
 from vector import ZERO2, Vector2
 from graphics import Graphics
-from game_config import BRICK_WIDTH, BRICK_HEIGHT, BRICK_NUMBER, BRICKS_COLORS, BALL_WIDTH,\
-                        BALL_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, IMAGE_FILE_NAME
+from game_config import BRICK_WIDTH, BRICK_HEIGHT, BRICK_NUMBER, BRICKS_COLORS, MULTI_HIT_COLORS,\
+                        BALL_WIDTH, BALL_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, IMAGE_FILE_NAME
 
 
 graphics = Graphics()  
 
 
+def brick_sprite_name(color, damaged=False):
+    if damaged:
+        return 'brick-%s-damaged' % color
+    return 'brick-%s' % color
+
+
+def register_sprites():
+    """
+    Cuts the entity sprites out of the texture atlas. From the top, the atlas has one row
+    per brick colour (the damaged MultiHit brick is the row below its colour), the paddle
+    and the ball. Called by Graphics once the display is open
+    """
+    for i, color in enumerate(BRICKS_COLORS):
+        graphics.register_sprite(brick_sprite_name(color), IMAGE_FILE_NAME,
+                                 pygame.Rect(0, BRICK_HEIGHT * i, BRICK_WIDTH, BRICK_HEIGHT))
+        if color in MULTI_HIT_COLORS:
+            graphics.register_sprite(brick_sprite_name(color, True), IMAGE_FILE_NAME,
+                                     pygame.Rect(0, BRICK_HEIGHT * (i + 1), BRICK_WIDTH, BRICK_HEIGHT))
+    graphics.register_sprite('paddle', IMAGE_FILE_NAME, 
+                             pygame.Rect(0, BRICK_NUMBER * BRICK_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT))
+    graphics.register_sprite('ball', IMAGE_FILE_NAME, 
+                             pygame.Rect(0, (BRICK_NUMBER * BRICK_HEIGHT) + PADDLE_HEIGHT, BALL_WIDTH, BALL_HEIGHT))
+
+
+graphics.add_sprite_loader(register_sprites)
+
+
 class Entity(object):
     """
     Represents the entities of the game, which are game objects with a graphics and a physics representation
     """
-    def __init__(self, body, surface, surface_src):
+    def __init__(self, body, sprite):
         self.body = body
-        self.surface = surface 
-        self.surface_src = surface_src 
+        self.sprite = sprite # Surface registered in the Graphics sprite registry
+        self.entity_id = None # Assigned by the EntityRegistry the entity is added to
+
+    def reset_body(self, x, y):
+        """
+        Puts the body back at (x, y), static and still, so the entity can be reused
+        """
+        self.body.rect.position.set(x, y)
+        self.body.direction.set(0.0, 0.0)
+        self.body.set_velocity(0.0)
+        self.body.is_static = True
 
 
 class Brick(Entity):
-    def __init__(self, body, surface, surface_src, health_points=1):
-        super(Brick, self).__init__(body, surface, surface_src)
+    def __init__(self, body, sprite, health_points=1):
+        super(Brick, self).__init__(body, sprite)
         self.health_points = health_points 
         
     def apply_damage(self, damage_points=1):
+        """
+        Returns whether this damage destroyed the brick
+        """
+        was_alive = self.health_points > 0
         self.health_points = max(0, self.health_points - damage_points)
+        return was_alive and self.health_points == 0
 
 
 class DefaultBrick(Brick):  
     def __init__(self, x, y, brick_color, health_points=1):           
-        surface_src_b = None
-        for i, color in enumerate(BRICKS_COLORS): 
-            if color == brick_color:     
-                surface_src_b = pygame.Rect(0, BRICK_HEIGHT * i, BRICK_WIDTH, BRICK_HEIGHT)
-                break
+        self.color = brick_color
         super(DefaultBrick, self).__init__(Body(Rect(Vector2(x, y), 
                                                      BRICK_WIDTH, 
                                                      BRICK_HEIGHT),
@@ -62,23 +103,33 @@ class DefaultBrick(Brick):
                                                 'brick',
                                                 self, # general purpose tag references the body's owner entity
                                                 True),
-                                           graphics.get_image(IMAGE_FILE_NAME), 
-                                           surface_src_b, health_points)
+                                           graphics.get_sprite(brick_sprite_name(brick_color)), 
+                                           health_points)
+
+    def reset(self, x, y, brick_color, health_points=1):
+        self.reset_body(x, y)
+        self.color = brick_color
+        self.sprite = graphics.get_sprite(brick_sprite_name(brick_color))
+        self.health_points = health_points
 
 
 class MultiHit(DefaultBrick):   
     def __init__(self, x, y, color, health_points=2):           
         super(MultiHit, self).__init__(x, y, color, health_points)
 
+    def reset(self, x, y, color, health_points=2):
+        super(MultiHit, self).reset(x, y, color, health_points)
+
     def apply_damage(self, damage_points=1):
-        self.health_points = max(0, self.health_points - damage_points)    
+        destroyed = super(MultiHit, self).apply_damage(damage_points)
         if self.health_points == 1:  
-            self.surface_src.top = self.surface_src.top + BRICK_HEIGHT
+            self.sprite = graphics.get_sprite(brick_sprite_name(self.color, True))
+        return destroyed
 
 
 class Ball(Entity):
-    def __init__(self, body, surface, surface_src, damage_points=1):
-        super(Ball, self).__init__(body, surface, surface_src)
+    def __init__(self, body, sprite, damage_points=1):
+        super(Ball, self).__init__(body, sprite)
         self.damage_points = damage_points 
 
 
@@ -94,16 +145,17 @@ class DefaultBall(Ball):
                                                'ball',
                                                self, # general purpose tag references the body's owner entity
                                                True),
-                                          graphics.get_image(IMAGE_FILE_NAME),
-                                          pygame.Rect(0, (BRICK_NUMBER * BRICK_HEIGHT) + PADDLE_HEIGHT, 
-                                                          BALL_WIDTH, 
-                                                          BALL_HEIGHT)) 
+                                          graphics.get_sprite('ball')) 
         self.damage_points = damage_points 
+
+    def reset(self, x, y, damage_points=1):
+        self.reset_body(x, y)
+        self.damage_points = damage_points
  
     
 class Paddle(Entity):
-    def __init__(self, body, surface, surface_src):
-        super(Paddle, self).__init__(body, surface, surface_src)
+    def __init__(self, body, sprite):
+        super(Paddle, self).__init__(body, sprite)
 
         
 class DefaultPaddle(Paddle):
@@ -115,7 +167,101 @@ class DefaultPaddle(Paddle):
                                                  'paddle',
                                                  self,
                                                  True),
-                                            graphics.get_image(IMAGE_FILE_NAME), 
-                                            pygame.Rect(0, BRICK_NUMBER * BRICK_HEIGHT, 
-                                                        PADDLE_WIDTH, 
-                                                        PADDLE_HEIGHT))        
+                                            graphics.get_sprite('paddle'))        
+
+    def reset(self, x, y):
+        self.reset_body(x, y)
+
+
+class EntityRegistry(object):
+    """
+    Entities of a game, with O(1) insertion and removal. Each entity gets an id, unique
+    for the lifetime of the registry, and entities are also listed by kind (the object
+    type of their body, e.g. 'brick'). The lists of each kind are kept up to date, so
+    they can be held on to
+    """
+    def __init__(self, kinds):
+        self.next_id = 0
+        self.entities = IndexedList()
+        self.by_id = {}
+        self.kinds = dict((kind, IndexedList()) for kind in kinds)
+
+    def add(self, entity):
+        """
+        Adds an entity if it is not registered. Returns whether it was added
+        """
+        if not self.entities.append(entity):
+            return False
+        entity.entity_id = self.next_id
+        self.next_id += 1
+        self.by_id[entity.entity_id] = entity
+        kind = self.kinds.get(entity.body.object_type)
+        if kind is not None:
+            kind.append(entity)
+        return True
+
+    def remove(self, entity):
+        """
+        Removes an entity if it is registered. Returns whether it was removed
+        """
+        if not self.entities.remove(entity):
+            return False
+        del self.by_id[entity.entity_id]
+        kind = self.kinds.get(entity.body.object_type)
+        if kind is not None:
+            kind.remove(entity)
+        return True
+
+    def clear(self):
+        self.entities.clear()
+        self.by_id = {}
+        for kind in self.kinds.values():
+            kind.clear()
+
+    def get(self, entity_id):
+        return self.by_id.get(entity_id)
+
+    def view(self, kind):
+        """
+        Gets the list of the entities of a kind
+        """
+        return self.kinds[kind]
+
+    def __contains__(self, entity):
+        return entity in self.entities
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __iter__(self):
+        return iter(self.entities)
+
+
+class EntityPool(object):
+    """
+    Entities no longer in play, by class, reused instead of building new ones. Pooled
+    classes have a reset() method taking the arguments of their constructor. Maps may be
+    built by another thread (see map.MapPrefetcher), hence the lock
+    """
+    def __init__(self):
+        self.free = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, entity_class, *args):
+        """
+        Gets an entity_class(*args), reusing a released entity if there is one
+        """
+        with self.lock:
+            free = self.free.get(entity_class)
+            entity = free.pop() if free else None
+        if entity is None:
+            return entity_class(*args)
+        entity.reset(*args)
+        return entity
+
+    def release(self, entity):
+        """
+        Gives an entity back to the pool. It must not be used anymore
+        """
+        with self.lock:
+            self.free.setdefault(type(entity), []).append(entity)
@@ -34,6 +34,7 @@ BRICK_HEIGHT = 20
 COUNT_STROKERS = 2 
 
 BRICKS_COLORS = ['pink', 'red', 'blue', 'yellow', 'green', 'grey']
+MULTI_HIT_COLORS = ['grey'] # Colours with a damaged brick sprite, the only ones of MultiHit bricks
 
 PADDLE_WIDTH = 80 # 80x20 pixels
 PADDLE_HEIGHT = 20
@@ -48,10 +49,40 @@ TEXT_LINE_SPACING = 50  # Vertical space between lines of text.
 TEXT_LINE_HORIZONTAL_SPACING = 50  # Horizontal space between lines of text.
 FONT_SIZE_BASIC = 25
 FONT_SIZE_BIG = 100
+FONT_CACHE_SIZE = 8 # Fonts kept loaded
+TEXT_CACHE_BYTES = 2 * 1024 * 1024 # Memory budget of the rendered text surfaces
 
 STEP_TIME_INTEGRATE = 10 # ms
 STEP_TIME = 10 # ms
 MAX_FPS = 1000 / STEP_TIME + 1 # Adds +1 in case the division is not exact
+MAX_SUBSTEPS = 10 # Most game steps run per frame; slower frames slow the game down instead
+RENDER_INTERPOLATION = True # Draws balls and paddles between their last two step positions
+
+IDLE_SCREEN_EVENT_DRIVEN = True # Menu and message screens sleep until an event instead of polling
+IDLE_SCREEN_FPS = 4 # Redraw rate of an idle screen when it is not event driven
+
+DIRTY_RECT_RENDERING = True # Redraws and updates only the display areas that changed
+
+USE_SPATIAL_HASH = True # Hashes the bodies once there are many; False always uses the brute force broadphase
+CONTINUOUS_COLLISION = False # Swept collisions, allowing the larger STEP_TIME_INTEGRATE_CCD step
+STEP_TIME_INTEGRATE_CCD = 40 # ms
+PHYSICS_BACKEND = 'python' # 'python' or 'numpy' (NumPy arrays backend, see physics_numpy.py)
+BALL_COLLISIONS = False # Balls bounce off each other (solved as dynamic/dynamic contacts)
+
+MULTIBALL_ENABLED = False # Destroying bricks releases the multiball power-up
+MULTIBALL_BRICKS = 5 # Bricks destroyed per multiball power-up
+MULTIBALL_SPLIT = 3 # Balls each ball in play becomes when the power-up is released
+MULTIBALL_SPREAD = 0.35 # Angle between the directions of split balls (radians)
+MULTIBALL_MAX_BALLS = 500 # Balls in play are never split beyond this count
+
+PROFILER_ENABLED = False # Per phase frame timings and counters, see profiler.py
+PROFILER_FRAMES = 600 # Frames kept in the profiler ring buffer
+PROFILER_DUMP_FILE = 'frame_profile.csv' # Written on exit when the profiler is enabled
+PROFILER_FONT_SIZE = 18
+PROFILER_OVERLAY_REFRESH = 500 # ms between updates of the overlay (toggled with F3)
+
+RECORD_SESSIONS = False # Records the input of every game for replay.py, see recording.py
+RECORDINGS_DIR = 'recordings'
 
 PADDLE_VELOCITY = 0.5 # pixels / second
 
@@ -62,4 +93,8 @@ BALL_VELOCITY_Y = 0.289631971155
 
 BALL_PUSH = 6000 # Delay time to automatically push the ball (ms)
 
+LEVEL_PACK = None # Level pack file played instead of the built-in maps, see levelpack.py
+LEVEL_CACHE_SIZE = 8 # Parsed levels kept in memory
+PREFETCH_MAPS = True # Builds the next map in a worker thread while the current one is played
+
 IMAGE_FILE_NAME = "textures.png"
@@ -24,18 +24,47 @@ import math
 from game_config import TITLE_COLOR, BLACK, BLUE, FONT_SIZE_BASIC, FONT_SIZE_BIG, TEXT_LINE_SPACING,\
                         WINDOW_WIDTH, WINDOW_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_VELOCITY,\
                         PADDLE_LINE_SPACING,BALL_WIDTH, BALL_HEIGHT, BALL_VELOCITY_Y, BALL_VELOCITY_X,\
-                        BALL_PUSH, STEP_TIME, MAX_FPS, STEP_TIME_INTEGRATE           
+                        BALL_PUSH, MAX_FPS, STEP_TIME_INTEGRATE, USE_SPATIAL_HASH,\
+                        PHYSICS_BACKEND, CONTINUOUS_COLLISION, STEP_TIME_INTEGRATE_CCD,\
+                        BRICK_WIDTH, BRICK_HEIGHT, BRICK_SPACING, DIRTY_RECT_RENDERING,\
+                        IDLE_SCREEN_EVENT_DRIVEN, IDLE_SCREEN_FPS,\
+                        PROFILER_ENABLED, PROFILER_FRAMES, MAX_SUBSTEPS, RENDER_INTERPOLATION,\
+                        LEVEL_PACK, PREFETCH_MAPS,\
+                        BALL_COLLISIONS, MULTIBALL_ENABLED, MULTIBALL_BRICKS, MULTIBALL_SPLIT,\
+                        MULTIBALL_SPREAD, MULTIBALL_MAX_BALLS
 from graphics import Graphics
 import utils
+from timestep import FixedTimestep
 import inputs
 import physics
-from map import MapSelector
-from vector import ZERO2, Vector2, normalize, magnitude, sum, dot, mul, rotate
+import profiler
+import levelpack
+from map import MapSelector, MapPrefetcher
+from entity import EntityRegistry, DefaultBall
+from vector import ZERO2, LEFT2, RIGHT2, Vector2, normalize, magnitude, dot
 
 
 graphics = Graphics() 
 
 
+def run_idle_screen(draw, fps_clock):
+    """
+    Shows a screen until the user presses a key. draw() renders the screen, which is drawn
+    once and then sleeps on the event queue (only woken up when the window has to be
+    redrawn), or is redrawn IDLE_SCREEN_FPS times per second when IDLE_SCREEN_EVENT_DRIVEN
+    is off
+    """
+    if IDLE_SCREEN_EVENT_DRIVEN:
+        draw()
+        while inputs.wait_for_key() is None:
+            draw()
+    else:
+        while not inputs.is_key_pressed(): 
+            draw()
+            fps_clock.tick(IDLE_SCREEN_FPS)
+    inputs.clear_event_queue()
+
+
 class InitLayer:
     """
     Shows the initial game menu   
@@ -73,14 +102,14 @@ class InitLayer:
         """
         Waits for the user to either press the exit key or any other key to start the game       
         """
-        while not inputs.is_key_pressed(): 
-            graphics.clear_display_surf(BLACK)
-            graphics.get_display_surf().blit(self.title_surf_menu, self.title_rect_menu)
-            graphics.get_display_surf().blit(self.title_surf_enter, self.title_rect_enter)
-            graphics.get_display_surf().blit(self.title_surf_esc, self.title_rect_esc)
-            graphics.flip_display_surf()
-            self.fps_clock.tick(4)
-        inputs.clear_event_queue()
+        run_idle_screen(self.draw, self.fps_clock)
+
+    def draw(self):
+        graphics.clear_display_surf(BLACK)
+        graphics.get_display_surf().blit(self.title_surf_menu, self.title_rect_menu)
+        graphics.get_display_surf().blit(self.title_surf_enter, self.title_rect_enter)
+        graphics.get_display_surf().blit(self.title_surf_esc, self.title_rect_esc)
+        graphics.flip_display_surf()
 
     def at_exit(self):
         self.owner.set_layer(self.owner.GAME_LAYER)
@@ -96,25 +125,96 @@ class GameLayer:
     GAME_WIN_SCREEN = 3
     GAME_PAUSE_SCREEN = 4
     
-    def __init__(self, owner):
+    def __init__(self, owner, clock=None, input_source=None):
+        """
+        clock (get_ticks() and tick(fps)) and input_source (get_events()) default to the
+        real time clock and the pygame event queue; see headless.py for the simulated ones
+        """
         self.owner = owner        
         self.moving_right = False
         self.moving_left = False        
         self.push_balls = False 
+        self.push_time = 0.0 # Time since the ball was pushed (automatically pushed at BALL_PUSH)
+        self.ball_velocity = Vector2(BALL_VELOCITY_X, BALL_VELOCITY_Y) # Ball velocity when pushed
+
+        # Counters of the current game, used by the simulation tools
+        self.stats = {}
+        self.reset_stats()
+        self.rendering = True # Off when running headless
                
-        self.fps_clock = pygame.time.Clock() 
+        self.clock = clock or utils.RealTimeClock()
+        self.input_source = input_source or inputs.EventQueueInput()
            
-        self.physics_world = physics.PhysicsWorld(STEP_TIME_INTEGRATE) 
+        if PHYSICS_BACKEND == 'numpy':
+            if CONTINUOUS_COLLISION:
+                raise ValueError('CONTINUOUS_COLLISION is not supported by the numpy physics backend')
+            import physics_numpy # NumPy is only required by this backend
+            self.physics_world = physics_numpy.ArrayPhysicsWorld(STEP_TIME_INTEGRATE, BALL_COLLISIONS,
+                                                                 BRICK_WIDTH, BRICK_HEIGHT)
+        else:
+            if USE_SPATIAL_HASH:
+                broadphase = physics.AdaptiveBroadphase(BRICK_WIDTH, BRICK_HEIGHT)
+            else:
+                broadphase = physics.BruteForceBroadphase()
+            if CONTINUOUS_COLLISION:
+                self.physics_world = physics.PhysicsWorld(STEP_TIME_INTEGRATE_CCD, broadphase, True,
+                                                          BALL_COLLISIONS)
+            else:
+                self.physics_world = physics.PhysicsWorld(STEP_TIME_INTEGRATE, broadphase,
+                                                          dynamic_collisions=BALL_COLLISIONS)
+
+        # The game is updated and simulated in steps of the physics world step
+        self.timestep = FixedTimestep(self.physics_world.step_ms, MAX_SUBSTEPS)
+        # Positions of the balls and paddles before the last step, to draw them in between
+        self.previous_positions = {}
+
+        # Frame profiler: per phase timings of the game loop, shown with F3 (main.py dumps the
+        # one of the game on exit)
+        self.profiler = None
+        if PROFILER_ENABLED:
+            self.profiler = profiler.FrameProfiler(PROFILER_FRAMES)
+            self.physics_world.profiler = self.profiler
+
+        # Session recorder (see recording.Recorder), only set by main.py for the game played
+        self.recorder = None
         
         self.game_status = GameLayer.INITIALIZATION       
-        self.current_map = MapSelector()
+        if LEVEL_PACK:
+            self.current_map = levelpack.PackMapSelector(LEVEL_PACK)
+        else:
+            self.current_map = MapSelector()
+        self.prefetcher = None
+        if PREFETCH_MAPS:
+            self.prefetcher = MapPrefetcher(self.current_map, self.prepare_map)
         
-        self.bricks = []
-        self.paddles = []
-        self.balls = []
+        # bricks, paddles and balls are the registry lists of each kind, kept up to date
+        # as entities are registered and unregistered
+        self.registry = EntityRegistry(('brick', 'paddle', 'ball'))
+        self.bricks = self.registry.view('brick')
+        self.paddles = self.registry.view('paddle')
+        self.balls = self.registry.view('ball')
 
-        self.entities = []
-        self.bodies = []       
+        self.entities = self.registry.entities
+        self.bodies = utils.IndexedList() # Bodies without an entity (the walls)
+        self.destroyed_bricks = [] # Bricks destroyed in the last step, unregistered by update()
+        self.lost_balls = utils.IndexedList() # Balls that reached the bottom wall in the current step, once each
+
+        # Multiball power-up: released every MULTIBALL_BRICKS destroyed bricks, the balls
+        # are split by update()
+        self.multiball_bricks = 0
+        self.multiball_pending = False
+
+        # Bricks are drawn once into brick_layer, which is patched when a brick is damaged.
+        # The patched areas are kept in brick_layer_rects until they reach the display.
+        # The layer of a new map is only drawn when its first frame is rendered, so
+        # headless games never draw it
+        self.brick_layer = None
+        self.brick_layer_rects = []
+        self.brick_layer_stale = True
+
+        # Dirty rectangle rendering: (destination rect, sprite) last drawn for each
+        # ball and paddle
+        self.drawn_rects = {}
         
         on_ball_brick_event = self.physics_world.CallBack('ball', 'brick', self.on_ball_brick_collision)
         on_ball_paddle_event = self.physics_world.CallBack('ball', 'paddle', self.on_ball_paddle_collision)
@@ -129,82 +229,221 @@ class GameLayer:
         self.physics_world.add_callback(on_ball_left_wall_event)
         self.physics_world.add_callback(on_ball_right_wall_event)     
         
-    def initialize(self, previous_layer):      
+    def initialize(self, previous_layer, first_map=0):
+        """
+        Starts a new game on the map of index first_map
+        """
         self.moving_right = False
         self.moving_left = False           
         self.push_balls = False
+        self.push_time = 0.0
+        self.reset_stats()
+        # A new game must not inherit the step time left over by the previous one
+        self.timestep.reset()
         
         self.game_status = GameLayer.INITIALIZATION            
         self.current_map.initialize_current_map()
+        if first_map != 0:
+            self.current_map.select_map(first_map)
         self.update_map()
+        if self.recorder is not None:
+            self.recorder.start()
         
     def clear_game(self):
-        self.bricks = []
-        self.paddles = []
-        self.balls = []
-
-        self.entities = []
-        self.bodies = []
-        
+        # Bodies leave the world first: it may hold their state (see physics_numpy), and the
+        # map prefetcher may reuse a released entity at once
         self.physics_world.clear_bodies()
+
+        # The entities of the previous map are reused by the next maps
+        for entity in self.registry:
+            self.current_map.pool.release(entity)
+        self.registry.clear()
+        self.bodies.clear()
+        self.destroyed_bricks = []
+        self.lost_balls.clear()
+        self.multiball_bricks = 0
+        self.multiball_pending = False
+        self.previous_positions = {}
         
         self.push_balls = False
     
     def update_map(self):
         self.clear_game()
-        m = self.current_map.get_next_map()
+        if self.prefetcher is not None:
+            m = self.prefetcher.get_next_map()
+        else:
+            m = self.current_map.get_next_map()
+        if m.brick_origin is not None:
+            self.physics_world.set_lattice(physics.LatticeIndex(m.brick_origin,
+                                                                BRICK_WIDTH + BRICK_SPACING,
+                                                                BRICK_HEIGHT + BRICK_SPACING,
+                                                                'brick'))
         
         for brick in m.bricks:
             self.register_entity(brick)
-            self.bricks.append(brick)
 
         for ball in m.balls:
             self.register_entity(ball)
-            self.balls.append(ball)
 
         for paddle in m.paddles:
             self.register_entity(paddle)
-            self.paddles.append(paddle)
 
         for body in m.bodies:
             self.register_body(body)
 
+        if m.brick_layer is not None:
+            self.brick_layer = m.brick_layer
+            self.brick_layer_stale = False
+            self.brick_layer_rects = []
+            self.drawn_rects = {}
+        else:
+            self.brick_layer_stale = True
+
+        # Prefetching only pays off when the game is drawn (prebuilt maps come with their
+        # brick layer); headless games build each map when they reach it
+        if self.prefetcher is not None and self.rendering:
+            self.prefetcher.prefetch(self.current_map.current_map + 1)
+
+    def prepare_map(self, m):
+        """
+        Draws the bricks of a map prebuilt by the prefetcher into its own brick layer.
+        Runs in the prefetcher thread
+        """
+        display_surf = graphics.get_display_surf()
+        m.brick_layer = pygame.Surface(display_surf.get_size(), 0, display_surf)
+        self.draw_bricks(m.bricks, m.brick_layer)
+
+    def build_brick_layer(self):
+        """
+        Draws the background and every brick into the cached brick layer
+        """
+        if self.brick_layer is None:
+            self.brick_layer = pygame.Surface(graphics.get_display_surf().get_size()).convert()
+        self.draw_bricks(self.bricks, self.brick_layer)
+        self.brick_layer_stale = False
+        self.brick_layer_rects = []
+        self.drawn_rects = {}
+
+    def draw_bricks(self, bricks, target):
+        target.fill(BLUE)
+        for brick in bricks:
+            position = brick.body.rect.position
+            graphics.draw(brick.sprite, pygame.Rect(position.x, position.y, brick.body.rect.w, brick.body.rect.h),
+                          target)
+
+    def patch_brick_layer(self, brick):
+        """
+        Redraws the area of a damaged brick in the brick layer, erasing it if destroyed
+        """
+        dest_rect = self.entity_rect(brick)
+        self.brick_layer.fill(BLUE, dest_rect)
+        if brick.health_points > 0:
+            graphics.draw(brick.sprite, dest_rect, self.brick_layer)
+        self.brick_layer_rects.append(dest_rect)
+
     def register_body(self, new_body):
-        if not new_body in self.bodies:
+        if self.bodies.append(new_body):
             self.physics_world.add_body(new_body)
-            self.bodies.append(new_body)
 
     def register_entity(self, new_entity):
-        if not new_entity in self.entities:
+        if self.registry.add(new_entity):
             self.physics_world.add_body(new_entity.body)
-            self.entities.append(new_entity) 
 
     def unregister_entity(self, entity):
-        if entity in self.entities:
+        if self.registry.remove(entity):
             self.physics_world.delete_body(entity.body)
-            self.entities.remove(entity)                              
+
+    def reset_stats(self):
+        self.stats['bricks_hit'] = 0
+        self.stats['paddle_bounces'] = 0
+        self.stats['balls_lost'] = 0
+
+    def serve_balls(self):
+        """
+        Puts the balls back on the paddle, waiting to be pushed again
+        """
+        for ball in self.balls:
+            self.physics_world.set_static(ball.body, True)
+            self.physics_world.set_velocity(ball.body, 0.0)
+        self.push_balls = False
+        self.push_time = 0.0
+        self.game_status = GameLayer.INITIALIZATION
 
     def on_ball_brick_collision(self, ball_body, brick_body, normal):       
+        self.stats['bricks_hit'] += 1
         brick_ent = brick_body.tag_ent
         ball_ent = ball_body.tag_ent
-        brick_ent.apply_damage(ball_ent.damage_points) 
-        ball_ent.body.set_velocity(min(self.physics_world.MAX_SPEED, ball_body.velocity * 1.1)) 
+        if brick_ent.apply_damage(ball_ent.damage_points):
+            self.destroyed_bricks.append(brick_ent)
+            if MULTIBALL_ENABLED:
+                self.multiball_bricks += 1
+                if self.multiball_bricks >= MULTIBALL_BRICKS:
+                    self.multiball_bricks = 0
+                    self.multiball_pending = True
+        if not self.brick_layer_stale: # Otherwise the whole layer is drawn before the next frame
+            self.patch_brick_layer(brick_ent)
+        self.physics_world.set_velocity(ball_body, min(self.physics_world.MAX_SPEED, ball_body.velocity * 1.1))
         
     def on_ball_paddle_collision(self, ball_body, paddle_body, normal):
         # Adjusts the ball direction if the paddle is moving when the ball collides with it
+        self.stats['paddle_bounces'] += 1
         angle = math.acos(dot(normal, ball_body.direction)) # Angle between the reflected direction and the normal
         delta_angle = abs(((math.pi * 0.5) - angle) * 0.5) # Half the angle that remains if were to perform a 90 degree reflection
         if paddle_body.direction.x > 0: # Clockwise rotation because the paddle is moving to the right
-            ball_body.direction = normalize(rotate(ball_body.direction, delta_angle))
+            ball_body.direction.rotate_inplace(delta_angle)
+            ball_body.direction.normalize_inplace()
         elif paddle_body.direction.x < 0: # Counter-clockwise rotation because the paddle is moving to the left
-            ball_body.direction = normalize(rotate(ball_body.direction, -delta_angle))           
+            ball_body.direction.rotate_inplace(-delta_angle)
+            ball_body.direction.normalize_inplace()           
                    
-    def on_ball_bottom_wall_collision(self, bottom_body, ball_body, normal):
-        if len(self.balls) == 1:
-            self.game_status = GameLayer.GAME_EXIT     
+    def on_ball_bottom_wall_collision(self, ball_body, bottom_body, normal):
+        # Lost balls are removed by remove_lost_balls() once the step is simulated. A ball
+        # may touch the bottom wall more than once in a step, it is only lost once
+        if self.lost_balls.append(ball_body.tag_ent):
+            self.stats['balls_lost'] += 1
+
+    def remove_lost_balls(self):
+        """
+        Removes the balls lost in the last step. The game ends when no ball is left (the
+        last ones are kept to be drawn behind the game over screen)
+        """
+        if len(self.lost_balls) >= len(self.balls):
+            self.game_status = GameLayer.GAME_EXIT
         else:
-            ball_ent = ball_body.tag_ent
-            self.unregister_entity(ball_ent)
+            for ball in self.lost_balls:
+                self.unregister_entity(ball)
+                self.current_map.pool.release(ball)
+        self.lost_balls.clear()
+
+    def split_balls(self):
+        """
+        Multiball power-up: each ball in play becomes MULTIBALL_SPLIT balls, going in
+        directions MULTIBALL_SPREAD apart, until there are MULTIBALL_MAX_BALLS balls.
+        The i-th new ball starts i ball diagonals away from its parent along its own
+        direction, so that none of them overlaps its parent or its siblings
+        """
+        diagonal = math.hypot(BALL_WIDTH, BALL_HEIGHT)
+        for ball in list(self.balls):
+            if ball.body.is_static:
+                continue
+            position = ball.body.rect.position
+            for i in range(1, MULTIBALL_SPLIT):
+                if len(self.balls) >= MULTIBALL_MAX_BALLS:
+                    return
+                new_ball = self.current_map.pool.acquire(DefaultBall, position.x, position.y, ball.damage_points)
+                direction = new_ball.body.direction
+                direction.vector_init(ball.body.direction)
+                # Alternately to each side of the original direction: +1, -1, +2, -2...
+                side = 1 if i % 2 else -1
+                direction.rotate_inplace(side * ((i + 1) // 2) * MULTIBALL_SPREAD)
+                direction.normalize_inplace()
+                # Kept inside the walls: a ball spawned beyond one would never come back
+                new_position = new_ball.body.rect.position
+                new_position.x = min(max(position.x + direction.x * i * diagonal, 0.0), WINDOW_WIDTH - BALL_WIDTH)
+                new_position.y = min(max(position.y + direction.y * i * diagonal, 0.0), WINDOW_HEIGHT - BALL_HEIGHT)
+                new_ball.body.set_velocity(ball.body.velocity)
+                new_ball.body.is_static = False
+                self.register_entity(new_ball)
     
     def on_ball_left_right_collision(self, ball_body, wall_body, normal):
         angle = math.acos(dot(normal, ball_body.direction)) # Angle between the reflected direction and the normal
@@ -213,25 +452,28 @@ class GameLayer:
         if angle < 0.1:
             delta_angle = 0.2
             if ball_body.direction.y > 0: # Counter-clockwise rotation because the ball is moving downwards
-                ball_body.direction = normalize(rotate(ball_body.direction, -delta_angle))
+                ball_body.direction.rotate_inplace(-delta_angle)
+                ball_body.direction.normalize_inplace()
             elif ball_body.direction.y <= 0: # Clockwise rotation because the ball is moving upwards 
-                ball_body.direction = normalize(rotate(ball_body.direction, delta_angle))   
+                ball_body.direction.rotate_inplace(delta_angle)
+                ball_body.direction.normalize_inplace()   
             
     def update(self, step_time):
         def change_dir_vel(entities, direction, velocity):
+            # Directions are copied: each body owns its direction vector
             for entity in entities:
-                entity.body.direction = direction
-                entity.body.set_velocity(velocity)
+                entity.body.direction.vector_init(direction)
+                self.physics_world.set_velocity(entity.body, velocity)
            
         if(self.moving_left or self.moving_right):
             if self.moving_left:
-                change_dir_vel(self.paddles, Vector2(-1,0), PADDLE_VELOCITY)
+                change_dir_vel(self.paddles, LEFT2, PADDLE_VELOCITY)
                 if self.game_status == GameLayer.INITIALIZATION:
-                    change_dir_vel(self.balls, Vector2(-1,0), PADDLE_VELOCITY)  
+                    change_dir_vel(self.balls, LEFT2, PADDLE_VELOCITY)  
             else:
-                change_dir_vel(self.paddles, Vector2(1,0), PADDLE_VELOCITY)
+                change_dir_vel(self.paddles, RIGHT2, PADDLE_VELOCITY)
                 if self.game_status == GameLayer.INITIALIZATION:
-                    change_dir_vel(self.balls, Vector2(1,0), PADDLE_VELOCITY)    
+                    change_dir_vel(self.balls, RIGHT2, PADDLE_VELOCITY)    
         else:
             change_dir_vel(self.paddles, ZERO2, magnitude(ZERO2))
             if self.game_status == GameLayer.INITIALIZATION:
@@ -239,25 +481,24 @@ class GameLayer:
                     
         if self.push_balls and self.game_status == GameLayer.INITIALIZATION:                  
             for ball in self.balls:
-                if ball.body.is_static:
-                    ball.body.is_static = False
-            v = Vector2(BALL_VELOCITY_X, BALL_VELOCITY_Y) 
-            change_dir_vel(self.balls, normalize(v), magnitude(v))
+                self.physics_world.set_static(ball.body, False)
+            change_dir_vel(self.balls, normalize(self.ball_velocity), magnitude(self.ball_velocity))
             self.push_balls = False
             self.game_status = GameLayer.GAME_LOOP
              
-        # Remove bricks that have been destroyed
-        free_brick_list = []
-        for brick in self.bricks:
-            if brick.health_points == 0:
-                self.unregister_entity(brick)
-                free_brick_list.append(brick)
-        self.bricks = [ b for b in self.bricks if free_brick_list.count(b) == 0 ] 
+        # Remove the bricks destroyed in the last step
+        for brick in self.destroyed_bricks:
+            self.unregister_entity(brick)
+            self.current_map.pool.release(brick)
+        self.destroyed_bricks = []
+
+        if self.multiball_pending:
+            self.split_balls()
+            self.multiball_pending = False
                 
         for paddle in self.paddles:          
             # Integrate paddle
-            paddle.body.rect.position = sum(paddle.body.rect.position,
-                                            mul(paddle.body.direction, paddle.body.velocity * step_time))
+            paddle.body.rect.position.iadd_scaled(paddle.body.direction, paddle.body.velocity * step_time)
     
             # Relocate paddle position to a valid position range
             paddle.body.rect.position.x = utils.clamp(paddle.body.rect.position.x, 0, 
@@ -266,72 +507,211 @@ class GameLayer:
 
         for ball in self.balls:
             if ball.body.is_static:
-                pos_r = Vector2((PADDLE_WIDTH - BALL_WIDTH) * 0.5,  - BALL_HEIGHT)
-                ball.body.rect.position = sum(self.paddles[0].body.rect.position, pos_r)
+                paddle_position = self.paddles[0].body.rect.position
+                ball.body.rect.position.set(paddle_position.x + (PADDLE_WIDTH - BALL_WIDTH) * 0.5,
+                                            paddle_position.y - BALL_HEIGHT)
+     
+    def process_event(self, event):
+        """
+        Applies an input event to the game
+        """
+        if event.type == pygame.QUIT:
+            utils.terminate()             
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_LEFT:
+                self.moving_left = True
+            elif event.key == pygame.K_RIGHT:
+                self.moving_right = True
+            elif event.key == pygame.K_a:
+                self.push_balls = True 
+            elif event.key == pygame.K_p: 
+                self.game_status = GameLayer.GAME_PAUSE_SCREEN
+            elif event.key == pygame.K_F3 and self.profiler is not None:
+                self.profiler.toggle_overlay()
+        elif event.type == pygame.KEYUP:
+            if event.key == pygame.K_ESCAPE:
+                utils.terminate()
+            elif event.key == pygame.K_RIGHT:
+                self.moving_right = False
+            elif event.key == pygame.K_LEFT:
+                self.moving_left = False  
+
+    def advance(self, delta_time, capped=True):
+        """
+        Advances the game delta_time ms in fixed steps, running at most MAX_SUBSTEPS of them
+        if capped (the game loop, where a stall must not be caught up)
+        """
+        for i in range(self.timestep.advance(delta_time, capped)):
+            self.step()
+
+    def step(self):
+        """
+        Updates and simulates the game one step
+        """
+        step_time = self.timestep.step_ms
+        self.push_time = self.push_time + step_time                
+        if self.push_time > BALL_PUSH: 
+            self.push_balls = True
+            self.push_time = 0.0
+
+        if self.rendering and RENDER_INTERPOLATION:
+            self.previous_positions = dict((entity, (entity.body.rect.position.x, entity.body.rect.position.y))
+                                           for entity in self.balls + self.paddles)
+        self.update(step_time)
+        self.physics_world.step()
+        if self.lost_balls:
+            self.remove_lost_balls()
+            
+        if len(self.bricks) < 1:
+            if not self.current_map.has_next_map():
+                self.game_status = GameLayer.GAME_WIN_SCREEN
+            else:
+                self.update_map()
+                self.game_status = GameLayer.INITIALIZATION
+                self.push_time = 0.0
      
     def run(self):
         """
         Main game loop: processes inputs, updates the game status and renders the game scene
         """        
-        last_update_time = pygame.time.get_ticks()
-        accumulated = 0.0
+        last_update_time = self.clock.get_ticks()
+        self.push_time = 0.0
+        self.drawn_rects = {} # Another layer may have drawn over the display
+        profiler = self.profiler
         while self.game_status == GameLayer.INITIALIZATION or self.game_status == GameLayer.GAME_LOOP:
-            #Process inputs       
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    utils.terminate()             
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_LEFT:
-                        self.moving_left = True
-                    elif event.key == pygame.K_RIGHT:
-                        self.moving_right = True
-                    elif event.key == pygame.K_a:
-                        self.push_balls = True 
-                    elif event.key == pygame.K_p: 
-                        self.game_status = GameLayer.GAME_PAUSE_SCREEN
-                elif event.type == pygame.KEYUP:
-                    if event.key == pygame.K_ESCAPE:
-                        utils.terminate()
-                    elif event.key == pygame.K_RIGHT:
-                        self.moving_right = False
-                    elif event.key == pygame.K_LEFT:
-                        self.moving_left = False  
+            if profiler is not None:
+                profiler.switch('input')
+            for event in self.input_source.get_events():
+                self.process_event(event)
                   
-            time = pygame.time.get_ticks()    
-            delta_time = time - last_update_time
-            
-            accumulated = accumulated + delta_time                
-            if accumulated > BALL_PUSH: 
-                self.push_balls = True
-                accumulated = 0.0
-            
-            while delta_time > 0:
-                sim_step_time = STEP_TIME
-                if delta_time - STEP_TIME < 0:
-                    sim_step_time = delta_time
-                self.update(sim_step_time)
-                self.physics_world.step_simulation(sim_step_time)
-                
-                if len(self.bricks) < 1:
-                    if not self.current_map.has_next_map():
-                        self.game_status = GameLayer.GAME_WIN_SCREEN
-                    else:
-                        self.update_map()
-                        self.game_status = GameLayer.INITIALIZATION
-                        accumulated = 0
-                delta_time -= sim_step_time
+            if profiler is not None:
+                profiler.switch('update')
+            time = self.clock.get_ticks()    
+            self.advance(time - last_update_time)
             last_update_time = time
-            graphics.clear_display_surf(BLUE)        
-            for entity in self.entities:            
-                dest_rect = pygame.Rect(entity.body.rect.position.x,
-                                        entity.body.rect.position.y,
-                                        entity.body.rect.w,
-                                        entity.body.rect.h)
-                graphics.draw(entity.surface, entity.surface_src, dest_rect)
-            graphics.flip_display_surf()
+            if profiler is not None:
+                profiler.switch('render')
+            if self.rendering:
+                if DIRTY_RECT_RENDERING:
+                    self.render_dirty()
+                else:
+                    self.render()
             
-            self.fps_clock.tick(MAX_FPS)
+            if profiler is not None:
+                profiler.switch('wait')
+            self.clock.tick(MAX_FPS)
+            if profiler is not None:
+                profiler.end_frame()
+
+        if self.recorder is not None and self.game_status != GameLayer.GAME_PAUSE_SCREEN:
+            self.recorder.finish()
             
+    def entity_rect(self, entity):
+        """
+        Gets the display rectangle of an entity, interpolated between its positions before
+        and after the last step by the fraction of a step elapsed since then
+        """
+        x = entity.body.rect.position.x
+        y = entity.body.rect.position.y
+        previous = self.previous_positions.get(entity)
+        if previous is not None:
+            alpha = self.timestep.alpha()
+            x = previous[0] + (x - previous[0]) * alpha
+            y = previous[1] + (y - previous[1]) * alpha
+        return pygame.Rect(x, y, entity.body.rect.w, entity.body.rect.h)
+
+    def draw_scene(self, target):
+        """
+        Draws the whole game scene on a target surface
+        """
+        if self.brick_layer_stale:
+            self.build_brick_layer()
+        target.blit(self.brick_layer, (0, 0))
+        for entity in self.balls + self.paddles:            
+            graphics.draw(entity.sprite, self.entity_rect(entity), target)
+
+    def render(self):
+        """
+        Draws the whole game scene and flips the display
+        """
+        self.draw_scene(graphics.get_display_surf())
+        if self.profiler is not None:
+            self.profiler.count('blits', 1 + len(self.balls) + len(self.paddles))
+        self.brick_layer_rects = []
+        self.draw_profiler_overlay()
+        graphics.flip_display_surf()
+
+    def render_dirty(self):
+        """
+        Draws only what changed since the last frame: the patched areas of the brick layer
+        and the balls and paddles that moved or changed. Their previous areas are erased
+        with the brick layer, the balls and paddles overlapping the changed areas are
+        redrawn and only those areas of the display are updated
+        """
+        display_surf = graphics.get_display_surf()
+        entities = self.balls + self.paddles
+        if self.brick_layer_stale:
+            self.build_brick_layer() # Also draws the whole display below
+
+        if not self.drawn_rects:
+            display_surf.blit(self.brick_layer, (0, 0))
+            for entity in entities:
+                dest_rect = self.entity_rect(entity)
+                graphics.draw(entity.sprite, dest_rect)
+                self.drawn_rects[entity] = (dest_rect, entity.sprite)
+            if self.profiler is not None:
+                self.profiler.count('blits', 1 + len(entities))
+            self.brick_layer_rects = []
+            self.draw_profiler_overlay()
+            graphics.flip_display_surf()
+            return
+
+        drawn_rects = {}
+        dirty_rects = self.brick_layer_rects
+        self.brick_layer_rects = []
+        for entity in entities:
+            dest_rect = self.entity_rect(entity)
+            drawn = (dest_rect, entity.sprite)
+            previous = self.drawn_rects.pop(entity, None)
+            if previous != drawn:
+                if previous is not None:
+                    dirty_rects.append(previous[0])
+                dirty_rects.append(dest_rect)
+            drawn_rects[entity] = drawn
+        # Entities left in drawn_rects have been removed
+        for dest_rect, sprite in self.drawn_rects.values():
+            dirty_rects.append(dest_rect)
+        self.drawn_rects = drawn_rects
+
+        if dirty_rects:
+            for rect in dirty_rects:
+                display_surf.blit(self.brick_layer, rect, rect)
+            blits = len(dirty_rects)
+            for entity in entities:
+                dest_rect = drawn_rects[entity][0]
+                if dest_rect.collidelist(dirty_rects) != -1:
+                    graphics.draw(entity.sprite, dest_rect)
+                    blits += 1
+            if self.profiler is not None:
+                self.profiler.count('blits', blits)
+        overlay_rect = self.draw_profiler_overlay()
+        if overlay_rect is not None:
+            dirty_rects.append(overlay_rect)
+        if dirty_rects:
+            graphics.update_display_rects(dirty_rects)
+
+    def draw_profiler_overlay(self):
+        """
+        Draws the profiler overlay, if shown, over the game scene before the display is
+        updated. Its area is redrawn with the brick layer on the next frame, so it
+        disappears when it is toggled off. Gets the overlay area, or None
+        """
+        if self.profiler is None or not self.profiler.overlay_visible:
+            return None
+        rect = self.profiler.draw_overlay(graphics.get_display_surf())
+        self.brick_layer_rects.append(rect)
+        return rect
+
     def at_exit(self):
         """
         Sets the next layer to execute: GameOverLayer or PauseLayer     
@@ -367,12 +747,12 @@ class  GameOverLayer:
         """
         Waits for the user input.
         """           
-        while not inputs.is_key_pressed():
-            graphics.clear_display_surf(BLACK)
-            graphics.get_display_surf().blit(self.title_over_surf, self.title_over_rect)
-            graphics.flip_display_surf()
-            self.fps_clock.tick(4)
-        inputs.clear_event_queue()          
+        run_idle_screen(self.draw, self.fps_clock)
+
+    def draw(self):
+        graphics.clear_display_surf(BLACK)
+        graphics.get_display_surf().blit(self.title_over_surf, self.title_over_rect)
+        graphics.flip_display_surf()
         
     def at_exit(self):
         """
@@ -400,12 +780,12 @@ class  PauseLayer:
         """
         Waits for the user input.
         """
-        while not inputs.is_key_pressed():
-            graphics.clear_display_surf(BLACK)
-            graphics.get_display_surf().blit(self.title_pause_surf, self.title_pause_rect)
-            graphics.flip_display_surf()           
-            self.fps_clock.tick(4)
-        inputs.clear_event_queue()            
+        run_idle_screen(self.draw, self.fps_clock)
+
+    def draw(self):
+        graphics.clear_display_surf(BLACK)
+        graphics.get_display_surf().blit(self.title_pause_surf, self.title_pause_rect)
+        graphics.flip_display_surf()
         
     def at_exit(self):
         """
@@ -436,12 +816,12 @@ class WinLayer:
         """
         Waits for the user input.
         """
-        while not inputs.is_key_pressed():
-            graphics.clear_display_surf(BLACK)
-            graphics.get_display_surf().blit(self.title_win_surf, self.title_win_rect)
-            graphics.flip_display_surf()           
-            self.fps_clock.tick(4)
-        inputs.clear_event_queue()            
+        run_idle_screen(self.draw, self.fps_clock)
+
+    def draw(self):
+        graphics.clear_display_surf(BLACK)
+        graphics.get_display_surf().blit(self.title_win_surf, self.title_win_rect)
+        graphics.flip_display_surf()
         
     def at_exit(self):
         """
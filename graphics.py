@@ -16,10 +16,13 @@
   Boston, MA 02110-1301, USA.
 '''
 
+import collections
+
+
 import pygame
 
 
-from game_config import WINDOW_WIDTH, WINDOW_HEIGHT 
+from game_config import WINDOW_WIDTH, WINDOW_HEIGHT, FONT_CACHE_SIZE, TEXT_CACHE_BYTES
 
 
 class Singleton(type):
@@ -30,17 +33,42 @@ class Singleton(type):
         return self._instances[self]
 
 
-class Graphics(object):
+class Graphics(Singleton('SingletonBase', (object,), {})): # Python 2 and 3 compatible metaclass
     """
     Render functions
     """
-    __metaclass__ = Singleton
     def __init__(self):
-        self.display_surf = pygame.display.set_mode((WINDOW_WIDTH, 
-                                                     WINDOW_HEIGHT))
+        self.display_surf = None # Opened by init_display() when first needed
         self.images = {}
+        self.sprites = {}
+        self.sprite_loaders = [] # Functions registering sprites, run by init_display()
+
+        # LRU caches, least recently used first
+        self.fonts = collections.OrderedDict() # font size -> font
+        self.text_surfaces = collections.OrderedDict() # (text, colour, font size) -> surface
+        self.text_surfaces_bytes = 0
     
+    def init_display(self):
+        """
+        Opens the game window and registers the sprites of the sprite loaders. Images are
+        converted to the display pixel format, so sprites can only be cut out from then on
+        """
+        self.display_surf = pygame.display.set_mode((WINDOW_WIDTH, 
+                                                     WINDOW_HEIGHT))
+        for loader in self.sprite_loaders:
+            loader()
+
+    def add_sprite_loader(self, loader):
+        """
+        Adds a function registering sprites. It is called once the display is open
+        """
+        self.sprite_loaders.append(loader)
+        if self.display_surf is not None:
+            loader()
+
     def get_display_surf(self):
+        if self.display_surf is None:
+            self.init_display()
         return self.display_surf
         
     def clear_display_surf(self, color):
@@ -48,21 +76,74 @@ class Graphics(object):
      
     def flip_display_surf(self):
         pygame.display.flip()   
+
+    def update_display_rects(self, rects):
+        """
+        Updates only the given areas of the display
+        """
+        pygame.display.update(rects)
+            
+    def get_font(self, font_size):
+        """
+        Gets the default font at a given size, keeping the last FONT_CACHE_SIZE fonts loaded
+        """
+        font = self.fonts.pop(font_size, None)
+        if font is None:
+            font = pygame.font.Font(None, font_size)
+            if len(self.fonts) >= FONT_CACHE_SIZE:
+                self.fonts.popitem(last=False)
+        self.fonts[font_size] = font
+        return font
             
     def make_text_obj(self, text, colour, font_size):
         """
-        Render a given text into a surface. Gets the surface its rectangle
+        Render a given text into a surface. Gets the surface its rectangle.
+        Rendered texts are cached up to TEXT_CACHE_BYTES of pixel data, so the returned
+        surface is shared and must not be drawn on. Texts larger than the whole budget
+        are not cached
         """
-        font = pygame.font.Font(None, font_size)
-        surf = font.render(text, True, colour)
+        key = (text, tuple(colour), font_size)
+        surf = self.text_surfaces.pop(key, None)
+        if surf is None:
+            surf = self.get_font(font_size).render(text, True, colour)
+            size = surf.get_width() * surf.get_height() * surf.get_bytesize()
+            if size > TEXT_CACHE_BYTES:
+                return surf, surf.get_rect()
+            while self.text_surfaces and self.text_surfaces_bytes + size > TEXT_CACHE_BYTES:
+                old_key, old_surf = self.text_surfaces.popitem(last=False)
+                self.text_surfaces_bytes -= old_surf.get_width() * old_surf.get_height() * old_surf.get_bytesize()
+            self.text_surfaces_bytes += size
+        self.text_surfaces[key] = surf
         return surf, surf.get_rect()
     
     def get_image(self, file_name):
         image = self.images.get(file_name, None)
         if not image:
+            self.get_display_surf()
             image = pygame.image.load(file_name)  
+            # Converted to the display pixel format, so that blits do not convert it again
+            if image.get_flags() & pygame.SRCALPHA:
+                image = image.convert_alpha()
+            else:
+                image = image.convert()
             self.images[file_name] = image 
         return image
+
+    def register_sprite(self, name, file_name, src_rect):
+        """
+        Registers the region src_rect of an image as a named sprite
+        """
+        self.sprites[name] = self.get_image(file_name).subsurface(src_rect)
+
+    def get_sprite(self, name):
+        if self.display_surf is None:
+            self.init_display()
+        return self.sprites[name]
     
-    def draw(self, surface, src_rect, dest_rect):
-        self.get_display_surf().blit(surface.subsurface(src_rect), dest_rect)     
+    def draw(self, sprite, dest_rect, target=None):
+        """
+        Draws a sprite on the display, or on the given target surface
+        """
+        if target is None:
+            target = self.get_display_surf()
+        target.blit(sprite, dest_rect)     
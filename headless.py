@@ -0,0 +1,144 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import os
+
+
+import pygame
+
+
+from game_config import STEP_TIME
+import game_layers
+
+
+class ManualClock(object):
+    """
+    Simulated clock: time only advances when told to. tick() advances it one frame of
+    frame_ms instead of waiting, so a game loop runs as fast as the CPU allows
+    """
+    def __init__(self, frame_ms=STEP_TIME):
+        self.time = 0
+        self.frame_ms = frame_ms
+
+    def get_ticks(self):
+        return self.time
+
+    def tick(self, fps):
+        self.time += self.frame_ms
+
+    def advance(self, ms):
+        self.time += ms
+
+
+class ScriptedInput(object):
+    """
+    Input source replaying (time ms, event type, key) entries, sorted by time, as pygame
+    events once the clock reaches their time
+    """
+    def __init__(self, clock, script):
+        self.clock = clock
+        self.script = list(script)
+        self.next = 0
+
+    def get_events(self):
+        events = []
+        while self.next < len(self.script) and self.script[self.next][0] <= self.clock.get_ticks():
+            time, event_type, key = self.script[self.next]
+            events.append(pygame.event.Event(event_type, key=key))
+            self.next += 1
+        return events
+
+
+class Simulation(object):
+    """
+    Runs GameLayer without a window and without waiting for the wall clock, so games are
+    deterministic and as fast as the CPU allows. Either step() the game programmatically,
+    or play() an input script through the same main loop the game runs.
+    The display, still needed by Graphics for its surfaces, uses SDL's dummy video driver
+    unless another one was selected, so a Simulation must be created before the display
+    is initialized
+    """
+    LEFT = 'left'
+    RIGHT = 'right'
+    LAUNCH = 'launch'
+
+    def __init__(self):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        self.clock = ManualClock()
+        self.layer = game_layers.GameLayer(None, self.clock, ScriptedInput(self.clock, []))
+        self.layer.rendering = False
+
+    def reset(self):
+        """
+        Starts a new game from the first map. Returns the game state
+        """
+        self.clock.time = 0
+        self.layer.initialize(None)
+        return self.state()
+
+    def start_map(self, index):
+        """
+        Starts a game on the map of the given index, reusing the world of the previous
+        game. Returns the game state
+        """
+        self.clock.time = 0
+        self.layer.initialize(None, index)
+        return self.state()
+
+    def step(self, inputs=(), dt=STEP_TIME):
+        """
+        Advances the game dt ms with the given inputs held (LEFT, RIGHT, LAUNCH).
+        Returns the game state
+        """
+        self.layer.moving_left = self.LEFT in inputs
+        self.layer.moving_right = self.RIGHT in inputs
+        if self.LAUNCH in inputs:
+            self.layer.push_balls = True
+        # The whole dt is simulated, however many steps it takes
+        self.layer.advance(dt, False)
+        self.clock.advance(dt)
+        return self.state()
+
+    def play(self, script):
+        """
+        Runs GameLayer.run from a new game until the game ends, feeding it the
+        (time ms, event type, key) entries of script. Returns the game state
+        """
+        self.reset()
+        self.layer.input_source = ScriptedInput(self.clock, script)
+        self.layer.run()
+        return self.state()
+
+    def done(self):
+        return self.layer.game_status not in (game_layers.GameLayer.INITIALIZATION, 
+                                              game_layers.GameLayer.GAME_LOOP)
+
+    def state(self):
+        """
+        Snapshot of the game: time, status, map index, paddle position, balls
+        (x, y, direction x, direction y, velocity) and the number of bricks left
+        """
+        layer = self.layer
+        return {'time': self.clock.get_ticks(),
+                'status': layer.game_status,
+                'map': layer.current_map.current_map,
+                'paddle': [(p.body.rect.position.x, p.body.rect.position.y) for p in layer.paddles],
+                'balls': [(b.body.rect.position.x, b.body.rect.position.y,
+                           b.body.direction.x, b.body.direction.y, b.body.velocity) for b in layer.balls],
+                'bricks': len(layer.bricks)}
@@ -44,6 +44,40 @@ def is_key_pressed():
             return event.key
     return None
 
+class EventQueueInput(object):
+    """
+    Input source reading the pygame event queue
+    """
+    def get_events(self):
+        return pygame.event.get()
+
+
+IDLE_TIMER_EVENT = pygame.USEREVENT + 1
+
+
+def wait_for_key(timeout_ms=0):
+    """
+    Sleeps until the user presses a key and returns it, checking for the EXIT button.
+    Returns None once timeout_ms has elapsed (if not 0) or when the window has to be
+    redrawn
+    """
+    if timeout_ms:
+        pygame.time.set_timer(IDLE_TIMER_EVENT, timeout_ms)
+    try:
+        while True:
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                utils.terminate()
+            elif event.type == pygame.KEYUP and event.key == pygame.K_ESCAPE:
+                utils.terminate()
+            elif event.type == pygame.KEYDOWN and event.key != pygame.K_ESCAPE:
+                return event.key
+            elif event.type == IDLE_TIMER_EVENT or event.type == pygame.VIDEOEXPOSE:
+                return None
+    finally:
+        if timeout_ms:
+            pygame.time.set_timer(IDLE_TIMER_EVENT, 0)
+
 def clear_event_queue():
         """
         Clears the event queue
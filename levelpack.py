@@ -0,0 +1,235 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import argparse
+import collections
+import mmap
+import struct
+
+
+import entity
+from map import Map, MapSelector, MapOne, MapTwo
+from vector import Vector2
+from game_config import WINDOW_WIDTH, BRICK_WIDTH, BRICK_HEIGHT, BRICK_SPACING, BRICKS_COLORS,\
+                        MULTI_HIT_COLORS, LEVEL_CACHE_SIZE
+
+
+# Level pack file format (little endian):
+#     + header: magic 'ARKP', version (uint16), level count (uint32)
+#     + index: offset and size in bytes (uint32, uint32) of each level
+#     + levels: columns (uint8), rows (uint8), y of the top row in pixels (int16), then
+#       rows x columns cells, row by row from the top: kind, colour index in BRICKS_COLORS
+#       and health points (3 x uint8, at least 1). Multi hit bricks only have the MULTI_HIT_COLORS
+# The brick grid is centered horizontally, like the built-in maps
+MAGIC = b'ARKP'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+INDEX_ENTRY = struct.Struct('<II')
+LEVEL_HEADER = struct.Struct('<BBh')
+CELL = struct.Struct('<BBB')
+
+EMPTY = 0
+BRICK = 1
+MULTI_HIT = 2
+
+
+class Level(object):
+    """
+    Brick grid of a level: cells[row][column] is None or a (kind, colour, health points) tuple
+    """
+    def __init__(self, columns, rows, top, cells):
+        self.columns = columns
+        self.rows = rows
+        self.top = top
+        self.cells = cells
+
+    def origin(self):
+        """
+        Gets the position of the top left cell
+        """
+        width = self.columns * BRICK_WIDTH + (self.columns - 1) * BRICK_SPACING
+        return Vector2((WINDOW_WIDTH - width) * 0.5, self.top)
+
+
+class LevelMap(Map):
+    """
+    Map whose bricks are built from a Level
+    """
+    def __init__(self, level, pool=None, walls=None):
+        super(LevelMap, self).__init__(pool, walls)
+        origin = level.origin()
+        self.brick_origin = origin
+        for row in range(level.rows):
+            for column in range(level.columns):
+                cell = level.cells[row][column]
+                if cell is None:
+                    continue
+                kind, color, health_points = cell
+                x = origin.x + column * (BRICK_WIDTH + BRICK_SPACING)
+                y = origin.y + row * (BRICK_HEIGHT + BRICK_SPACING)
+                if kind == MULTI_HIT:
+                    self.bricks.append(self.pool.acquire(entity.MultiHit, x, y, color, health_points))
+                else:
+                    self.bricks.append(self.pool.acquire(entity.DefaultBrick, x, y, color, health_points))
+
+
+def level_from_map(m):
+    """
+    Gets the Level of the bricks of a map, which must be laid on the brick lattice
+    """
+    pitch_x = BRICK_WIDTH + BRICK_SPACING
+    pitch_y = BRICK_HEIGHT + BRICK_SPACING
+    left = min(brick.body.rect.position.x for brick in m.bricks)
+    top = min(brick.body.rect.position.y for brick in m.bricks)
+    positions = [(int(round((brick.body.rect.position.x - left) / pitch_x)),
+                  int(round((brick.body.rect.position.y - top) / pitch_y))) for brick in m.bricks]
+    columns = max(column for column, row in positions) + 1
+    rows = max(row for column, row in positions) + 1
+    cells = [[None] * columns for row in range(rows)]
+    for brick, (column, row) in zip(m.bricks, positions):
+        kind = MULTI_HIT if isinstance(brick, entity.MultiHit) else BRICK
+        cells[row][column] = (kind, brick.color, brick.health_points)
+    return Level(columns, rows, int(round(top)), cells)
+
+
+def encode_level(level):
+    data = [LEVEL_HEADER.pack(level.columns, level.rows, level.top)]
+    for row in level.cells:
+        for cell in row:
+            if cell is None:
+                data.append(CELL.pack(EMPTY, 0, 0))
+            else:
+                kind, color, health_points = cell
+                if kind == MULTI_HIT and color not in MULTI_HIT_COLORS:
+                    raise ValueError('multi hit bricks cannot be %s' % color)
+                # A brick without health points would never be destroyed
+                if health_points < 1:
+                    raise ValueError('bricks need at least 1 health point, not %d' % health_points)
+                data.append(CELL.pack(kind, BRICKS_COLORS.index(color), health_points))
+    return b''.join(data)
+
+
+def write_pack(file_name, levels):
+    """
+    Writes a sequence of levels to a level pack file. A pack has at least one level
+    """
+    encoded = [encode_level(level) for level in levels]
+    if not encoded:
+        raise ValueError('%s: a level pack needs at least one level' % file_name)
+    offset = HEADER.size + INDEX_ENTRY.size * len(encoded)
+    with open(file_name, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(encoded)))
+        for data in encoded:
+            f.write(INDEX_ENTRY.pack(offset, len(data)))
+            offset += len(data)
+        for data in encoded:
+            f.write(data)
+
+
+class LevelPack(object):
+    """
+    Level pack file, memory mapped: levels are only parsed when requested, and the last
+    cache_size parsed levels are kept
+    """
+    def __init__(self, file_name, cache_size=LEVEL_CACHE_SIZE):
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise ValueError('%s: not a level pack' % file_name)
+        magic, version, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError('%s: not a level pack' % file_name)
+        if version != VERSION:
+            raise ValueError('%s: unsupported level pack version %d' % (file_name, version))
+        if self.count == 0:
+            raise ValueError('%s: level pack without levels' % file_name)
+        if HEADER.size + INDEX_ENTRY.size * self.count > len(self.data):
+            raise ValueError('%s: truncated level pack' % file_name)
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict() # level index -> Level, least recently used first
+
+    def __len__(self):
+        return self.count
+
+    def get_level(self, index):
+        level = self.cache.pop(index, None)
+        if level is None:
+            level = self.parse_level(index)
+            while len(self.cache) >= self.cache_size:
+                self.cache.popitem(last=False)
+        self.cache[index] = level
+        return level
+
+    def parse_level(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError('level %d out of range' % index)
+        offset, size = INDEX_ENTRY.unpack_from(self.data, HEADER.size + INDEX_ENTRY.size * index)
+        if size < LEVEL_HEADER.size or offset + size > len(self.data):
+            raise ValueError('%s: level %d is corrupt' % (self.file_name, index))
+        columns, rows, top = LEVEL_HEADER.unpack_from(self.data, offset)
+        if size != LEVEL_HEADER.size + CELL.size * columns * rows:
+            raise ValueError('%s: level %d is corrupt' % (self.file_name, index))
+        cells = []
+        offset += LEVEL_HEADER.size
+        for row in range(rows):
+            row_cells = []
+            for column in range(columns):
+                kind, color, health_points = CELL.unpack_from(self.data, offset)
+                offset += CELL.size
+                if kind == EMPTY:
+                    row_cells.append(None)
+                elif health_points < 1:
+                    raise ValueError('%s: level %d has a brick without health points' % (self.file_name, index))
+                elif kind == BRICK and color < len(BRICKS_COLORS):
+                    row_cells.append((kind, BRICKS_COLORS[color], health_points))
+                elif kind == MULTI_HIT and color < len(BRICKS_COLORS) and BRICKS_COLORS[color] in MULTI_HIT_COLORS:
+                    row_cells.append((kind, BRICKS_COLORS[color], health_points))
+                else:
+                    raise ValueError('%s: level %d has an invalid cell' % (self.file_name, index))
+            cells.append(row_cells)
+        return Level(columns, rows, top, cells)
+
+    def close(self):
+        self.data.close()
+
+
+class PackMapSelector(MapSelector):
+    """
+    Map selector playing the levels of a level pack, in order
+    """
+    def __init__(self, file_name):
+        MapSelector.__init__(self)
+        self.pack = LevelPack(file_name)
+
+    def get_map_count(self):
+        return len(self.pack)
+
+    def build_map(self, index):
+        return LevelMap(self.pack.get_level(index), self.pool, self.walls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes the built-in maps to a level pack')
+    parser.add_argument('output', help='level pack file')
+    args = parser.parse_args()
+    write_pack(args.output, [level_from_map(map_type()) for map_type in (MapOne, MapTwo)])
+
+if __name__ == '__main__':
+    main()
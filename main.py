@@ -17,15 +17,26 @@
 '''
 
 
+import atexit
+
+
 import pygame
 
 
 import game
+import recording
+from game_config import PROFILER_DUMP_FILE, RECORD_SESSIONS, RECORDINGS_DIR
 
 
 def main():
     pygame.init()
     g = game.Game()
+    layer = g.layers[g.GAME_LAYER]
+    if layer.profiler is not None:
+        atexit.register(layer.profiler.dump, PROFILER_DUMP_FILE)
+    # Only the games played are recorded, not the ones the headless tools simulate
+    if RECORD_SESSIONS:
+        layer.recorder = recording.Recorder(layer, RECORDINGS_DIR)
     g.run()
 
 if __name__ == '__main__':
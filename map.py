@@ -17,6 +17,9 @@
 '''
 
 
+import threading
+
+
 from vector import ZERO2, Vector2
 import entity
 from physics import Rect, Body
@@ -25,8 +28,30 @@ from game_config import WINDOW_WIDTH, WINDOW_HEIGHT, BALL_WIDTH, BALL_HEIGHT, PA
                         BRICK_WIDTH, BRICK_HEIGHT, BRICK_SPACING, BRICKS_COLORS
 
 
+def make_walls():
+    """
+    Creates the bodies enclosing the game screen area. They never change, so they can be
+    shared by the maps of a MapSelector
+    """
+    top_rect = Rect(Vector2(0.0, -WALL_HEIGHT), WINDOW_WIDTH, WALL_HEIGHT)
+    bottom_rect = Rect(Vector2(0.0, WINDOW_HEIGHT), WINDOW_WIDTH, WALL_HEIGHT)
+    left_rect = Rect(Vector2(-WALL_WIDTH, -WALL_HEIGHT), WALL_WIDTH, WINDOW_HEIGHT + 2 * WALL_HEIGHT)
+    right_rect = Rect(Vector2(WINDOW_WIDTH, -WALL_HEIGHT), WALL_WIDTH, WINDOW_HEIGHT + 2 * WALL_HEIGHT)
+    
+    return [Body(top_rect, ZERO2, 'top-wall', True),
+            Body(bottom_rect, ZERO2, 'bottom-wall', True),
+            Body(left_rect, ZERO2, 'left-wall', True),
+            Body(right_rect, ZERO2, 'right-wall', True)]
+
+
 class Map(object):   
-    def __init__(self):
+    """
+    Entities and bodies of a level. Entities are taken from pool and the wall bodies are
+    the given ones, when given
+    """
+    def __init__(self, pool=None, walls=None):
+        self.pool = pool or entity.EntityPool()
+
         # Entities
         self.balls = []
         self.bricks = []
@@ -34,67 +59,76 @@ class Map(object):
 
         # Other bodies
         self.bodies = []  
+
+        # Position of the brick at lattice cell (0, 0); None if bricks are not laid on a lattice
+        self.brick_origin = None
+
+        # Surface with the background and the bricks drawn, when the map was prebuilt
+        self.brick_layer = None
                   
-        ball_position = Vector2((WINDOW_WIDTH - BALL_WIDTH) * 0.5, 
-                                WINDOW_HEIGHT - PADDLE_HEIGHT - BALL_HEIGHT)      
-        self.balls.append(entity.DefaultBall(ball_position.x, ball_position.y))
+        self.balls.append(self.pool.acquire(entity.DefaultBall,
+                                            (WINDOW_WIDTH - BALL_WIDTH) * 0.5,
+                                            WINDOW_HEIGHT - PADDLE_HEIGHT - BALL_HEIGHT))
         
-        paddle_position = Vector2((WINDOW_WIDTH - PADDLE_WIDTH) * 0.5, 
-                                  WINDOW_HEIGHT - PADDLE_HEIGHT)       
-        self.paddles.append(entity.DefaultPaddle(paddle_position.x, paddle_position.y))    
+        self.paddles.append(self.pool.acquire(entity.DefaultPaddle,
+                                              (WINDOW_WIDTH - PADDLE_WIDTH) * 0.5,
+                                              WINDOW_HEIGHT - PADDLE_HEIGHT))
         
-        # Create bodies enclosing the game screen area
+        self.bodies.extend(walls or make_walls())
 
-        top_rect = Rect(Vector2(0.0, -WALL_HEIGHT), WINDOW_WIDTH, WALL_HEIGHT)
-        bottom_rect = Rect(Vector2(0.0, WINDOW_HEIGHT), WINDOW_WIDTH, WALL_HEIGHT)
-        left_rect = Rect(Vector2(-WALL_WIDTH, -WALL_HEIGHT), WALL_WIDTH, WINDOW_HEIGHT + 2 * WALL_HEIGHT)
-        right_rect = Rect(Vector2(WINDOW_WIDTH, -WALL_HEIGHT), WALL_WIDTH, WINDOW_HEIGHT + 2 * WALL_HEIGHT)
-        
-        self.bodies.append(Body(top_rect, ZERO2, 'top-wall', True))
-        self.bodies.append(Body(bottom_rect, ZERO2, 'bottom-wall', True))
-        self.bodies.append(Body(left_rect, ZERO2, 'left-wall', True))
-        self.bodies.append(Body(right_rect, ZERO2, 'right-wall', True))
+    def release(self):
+        """
+        Gives the entities of a map that is not going to be played back to its pool
+        """
+        for e in self.balls + self.bricks + self.paddles:
+            self.pool.release(e)
 
 
 class MapOne(Map):
-    def __init__(self):
+    def __init__(self, pool=None, walls=None):
         BRICK_COUNT_X = 11
         BRICK_COUNT_Y = 6        
-        super(MapOne, self).__init__()       
+        super(MapOne, self).__init__(pool, walls)       
         start_position = Vector2((WINDOW_WIDTH - (BRICK_COUNT_X * BRICK_WIDTH + (BRICK_COUNT_X - 1) * BRICK_SPACING) ) * 0.5, 
                                   WINDOW_HEIGHT * 0.5)        
+        self.brick_origin = start_position
         for y in range(BRICK_COUNT_Y):
             brick_color = BRICKS_COLORS[y % len(BRICKS_COLORS)]
             for x in range(BRICK_COUNT_X):
                 if brick_color != 'grey':
-                    self.bricks.append(entity.DefaultBrick(start_position.x + x * (BRICK_WIDTH + BRICK_SPACING),
-                                                           start_position.y - y * (BRICK_HEIGHT + BRICK_SPACING),
-                                                           brick_color))
+                    self.bricks.append(self.pool.acquire(entity.DefaultBrick,
+                                                         start_position.x + x * (BRICK_WIDTH + BRICK_SPACING),
+                                                         start_position.y - y * (BRICK_HEIGHT + BRICK_SPACING),
+                                                         brick_color))
                 else:
-                    self.bricks.append(entity.MultiHit(start_position.x + x * (BRICK_WIDTH + BRICK_SPACING),
-                                                       start_position.y - y * (BRICK_HEIGHT + BRICK_SPACING),
-                                                       brick_color))
+                    self.bricks.append(self.pool.acquire(entity.MultiHit,
+                                                         start_position.x + x * (BRICK_WIDTH + BRICK_SPACING),
+                                                         start_position.y - y * (BRICK_HEIGHT + BRICK_SPACING),
+                                                         brick_color))
                     
                     
 class MapTwo(Map):
-    def __init__(self):
+    def __init__(self, pool=None, walls=None):
         BRICK_COUNT_X = 11     
-        super(MapTwo, self).__init__()
+        super(MapTwo, self).__init__(pool, walls)
         
         start_position = Vector2((WINDOW_WIDTH - (BRICK_COUNT_X * BRICK_WIDTH + (BRICK_COUNT_X - 1) * BRICK_SPACING) ) * 0.5, 
                                   WINDOW_HEIGHT * 0.5)
+        self.brick_origin = start_position
         b_c = BRICKS_COLORS[:]
         b_c.remove('grey')
         for x in range(BRICK_COUNT_X):
             brick_color = b_c[x % len(b_c)]
             for y in range(BRICK_COUNT_X - x):
-                self.bricks.append(entity.DefaultBrick(start_position.x + x * (BRICK_WIDTH + BRICK_SPACING),
-                                                       start_position.y - y * (BRICK_HEIGHT + BRICK_SPACING),
-                                                       brick_color))                
+                self.bricks.append(self.pool.acquire(entity.DefaultBrick,
+                                                     start_position.x + x * (BRICK_WIDTH + BRICK_SPACING),
+                                                     start_position.y - y * (BRICK_HEIGHT + BRICK_SPACING),
+                                                     brick_color))                
         for x in range(BRICK_COUNT_X):
-            self.bricks.append(entity.MultiHit(start_position.x + x * (BRICK_WIDTH + BRICK_SPACING),
-                               start_position.y +  (BRICK_HEIGHT + BRICK_SPACING),
-                               'grey'))
+            self.bricks.append(self.pool.acquire(entity.MultiHit,
+                                                 start_position.x + x * (BRICK_WIDTH + BRICK_SPACING),
+                                                 start_position.y +  (BRICK_HEIGHT + BRICK_SPACING),
+                                                 'grey'))
             
 
 class MapSelector():
@@ -102,15 +136,103 @@ class MapSelector():
 
     def __init__(self):
         self.current_map = -1
+        # Shared by the maps built by this selector: they are used by a single game at a time
+        self.pool = entity.EntityPool()
+        self.walls = make_walls()
         
     def initialize_current_map(self):
         self.current_map = -1
         
+    def select_map(self, index):
+        """
+        Makes get_next_map() return the map of the given index
+        """
+        self.current_map = index - 1
+
+    def get_map_count(self):
+        return len(self.map_types)
+        
     def get_next_map(self):
         self.current_map = self.current_map + 1
-        return self.map_types[self.current_map]()
+        return self.build_map(self.current_map)
+
+    def build_map(self, index):
+        """
+        Builds the map of the given index
+        """
+        return self.map_types[index](self.pool, self.walls)
        
     def has_next_map(self):
-        if self.current_map + 1 < len(self.map_types):
+        if self.current_map + 1 < self.get_map_count():
             return True  
         return False
+
+
+class MapPrefetcher(object):
+    """
+    Builds a map of a MapSelector in a worker thread while the game goes on, so that
+    moving to it only has to take the prebuilt map. prepare(m), if given, is also run by
+    the worker on the built map. Maps are built one at a time
+    """
+    def __init__(self, selector, prepare=None):
+        self.selector = selector
+        self.prepare = prepare
+        self.build_lock = threading.Lock()
+        self.pending = None # (map index, thread, [(map, error)] once built)
+
+    def build(self, index):
+        with self.build_lock:
+            m = self.selector.build_map(index)
+            if self.prepare is not None:
+                self.prepare(m)
+            return m
+
+    def run(self, index, result):
+        try:
+            result.append((self.build(index), None))
+        except Exception as error:
+            result.append((None, error))
+
+    def prefetch(self, index):
+        """
+        Starts building the map of the given index, unless it is already being built
+        """
+        if not 0 <= index < self.selector.get_map_count():
+            return
+        if self.pending is not None and self.pending[0] == index:
+            return
+        self.discard()
+        result = []
+        thread = threading.Thread(target=self.run, args=(index, result))
+        thread.daemon = True
+        thread.start()
+        self.pending = (index, thread, result)
+
+    def discard(self):
+        """
+        Drops the map being prebuilt, if any: waits for its build and releases its entities
+        """
+        if self.pending is None:
+            return
+        index, thread, result = self.pending
+        self.pending = None
+        thread.join()
+        m, error = result[0]
+        if m is not None:
+            m.release()
+
+    def get_next_map(self):
+        """
+        Same as MapSelector.get_next_map, taking the prebuilt map if it is the next one
+        """
+        self.selector.current_map = self.selector.current_map + 1
+        index = self.selector.current_map
+        if self.pending is None or self.pending[0] != index:
+            return self.build(index)
+        index, thread, result = self.pending
+        self.pending = None
+        thread.join()
+        m, error = result[0]
+        if error is not None:
+            raise error
+        return m
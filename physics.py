@@ -21,9 +21,25 @@ import math
 
 
 import vector
+from timestep import FixedTimestep
 
 
-class Rect:
+# Opposite of each normal returned by PhysicsWorld.calculate_normal
+OPPOSITE_AXES = {vector.RIGHT2: vector.LEFT2, 
+                 vector.LEFT2: vector.RIGHT2,
+                 vector.UP2: vector.DOWN2,
+                 vector.DOWN2: vector.UP2}
+
+_object_type_ids = {}
+
+def object_type_id(object_type):
+    """
+    Returns the interned integer id of an object type name
+    """
+    return _object_type_ids.setdefault(object_type, len(_object_type_ids))
+
+
+class Rect(object):
     """
     Rectangular body shape
     """
@@ -48,7 +64,7 @@ class Rect:
         return vector.Vector2(self.position.x + self.w * 0.5, self.position.y + self.h * 0.5)
 
 
-class Body:
+class Body(object):
     """
     Body for physical objects
     """
@@ -57,6 +73,7 @@ class Body:
         self.set_velocity(vector.magnitude(velocity))
         self.direction = vector.normalize(velocity)
         self.object_type = object_type                   
+        self.type_id = object_type_id(object_type)
         self.is_static = is_static
         self.tag_ent = tag_ent
         
@@ -65,22 +82,346 @@ class Body:
 
     def integrate(self, elapsed_time):
         if not(self.is_static):
-            self.rect.position =  vector.sum(self.rect.position, vector.mul(self.direction, self.velocity * elapsed_time))
+            self.rect.position.iadd_scaled(self.direction, self.velocity * elapsed_time)
+
+
+class BruteForceBroadphase(object):
+    """
+    Reference broadphase: every dynamic body is paired with every other body
+    """
+    def invalidate(self):
+        pass
+
+    def pairs(self, dynamic_bodies, static_bodies, lattice=None, dynamic_pairs=True):
+        for i, b1 in enumerate(dynamic_bodies):
+            if dynamic_pairs:
+                for j in range(i + 1, len(dynamic_bodies)):
+                    yield b1, dynamic_bodies[j]
+            if lattice is not None:
+                for b2 in lattice.query(b1.rect):
+                    yield b1, b2
+            for b2 in static_bodies:
+                yield b1, b2
+
+    def query_static(self, static_bodies, left, top, right, bottom):
+        """
+        Gets the static bodies that may overlap the given bounds, in static_bodies order
+        """
+        return static_bodies
+
+
+class SpatialHashBroadphase(object):
+    """
+    Uniform grid broadphase: a dynamic body is only paired with the bodies sharing
+    one of its grid cells. Static bodies are kept hashed between steps and only
+    re-hashed when they move (the paddle) or when the static set changes. Bodies
+    covering more than max_cells cells (e.g. the walls) are not hashed, their cell
+    range is compared with the range of each dynamic body instead. Dynamic bodies are
+    hashed again on every query, with their positions at the start of the step.
+    The pairs are a subsequence of the BruteForceBroadphase pairs: they come in the
+    same relative order, and only pairs whose cell ranges did not intersect are left
+    out. Those pairs did not overlap when the ranges were taken, so both broadphases
+    solve the same contacts in the same order, unless solving a contact moves a body
+    into one it was not paired with (e.g. a dynamic body pushed into a dynamic body
+    hashed elsewhere at the start of the step). Then the collision is only solved on
+    the next step.
+    """
+    def __init__(self, cell_w, cell_h, max_cells=64):
+        self.cell_w = float(cell_w)
+        self.cell_h = float(cell_h)
+        self.max_cells = max_cells
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forces the static bodies to be re-hashed on the next query
+        """
+        self.static_cells = {}
+        self.static_large = []
+        self.static_keys = None
+
+    def cell_range(self, rect):
+        # Same as flooring left(), right(), top() and bottom(), without the method calls
+        x = rect.position.x
+        y = rect.position.y
+        return (int(math.floor(x / self.cell_w)),
+                int(math.floor((x + rect.w) / self.cell_w)),
+                int(math.floor(y / self.cell_h)),
+                int(math.floor((y + rect.h) / self.cell_h)))
+
+    def hash_static(self, index, b):
+        x0, x1, y0, y1 = self.cell_range(b.rect)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > self.max_cells:
+            self.static_large.append((index, x0, x1, y0, y1))
+        else:
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self.static_cells.setdefault((cx, cy), []).append(index)
+        return (b.rect.position.x, b.rect.position.y, x0, x1, y0, y1)
 
+    def unhash_static(self, index, key):
+        x, y, x0, x1, y0, y1 = key
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > self.max_cells:
+            self.static_large.remove((index, x0, x1, y0, y1))
+        else:
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self.static_cells[(cx, cy)].remove(index)
+
+    def update_static(self, static_bodies):
+        if self.static_keys is None:
+            self.static_keys = [self.hash_static(i, b) for i, b in enumerate(static_bodies)]
+            return
+        for i, b in enumerate(static_bodies):
+            key = self.static_keys[i]
+            if key[0] != b.rect.position.x or key[1] != b.rect.position.y:
+                self.unhash_static(i, key)
+                self.static_keys[i] = self.hash_static(i, b)
+
+    def hash_dynamic(self, dynamic_bodies):
+        # Gets cell -> indices of the dynamic bodies in it
+        cells = {}
+        for i, b in enumerate(dynamic_bodies):
+            x0, x1, y0, y1 = self.cell_range(b.rect)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    cells.setdefault((cx, cy), []).append(i)
+        return cells
+
+    def pairs(self, dynamic_bodies, static_bodies, lattice=None, dynamic_pairs=True):
+        self.update_static(static_bodies)
+        dynamic_cells = None
+        if dynamic_pairs and len(dynamic_bodies) > 1:
+            dynamic_cells = self.hash_dynamic(dynamic_bodies)
+        for i, b1 in enumerate(dynamic_bodies):
+            # Taken when b1 is reached, since earlier dynamic contacts may have moved it
+            x0, x1, y0, y1 = self.cell_range(b1.rect)
+            if dynamic_cells is not None:
+                others = set()
+                for cx in range(x0, x1 + 1):
+                    for cy in range(y0, y1 + 1):
+                        others.update(dynamic_cells.get((cx, cy), ()))
+                for j in sorted(others):
+                    if j > i:
+                        yield b1, dynamic_bodies[j]
+            if lattice is not None:
+                for b2 in lattice.query(b1.rect):
+                    yield b1, b2
+            for j in self.static_candidates(x0, x1, y0, y1):
+                yield b1, static_bodies[j]
+
+    def static_candidates(self, x0, x1, y0, y1):
+        # Sorted indices of the static bodies whose cells intersect the given cell range
+        candidates = set(j for j, lx0, lx1, ly0, ly1 in self.static_large
+                         if lx0 <= x1 and x0 <= lx1 and ly0 <= y1 and y0 <= ly1)
+        static_cells = self.static_cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = static_cells.get((cx, cy))
+                if cell:
+                    candidates.update(cell)
+        return sorted(candidates)
+
+    def query_static(self, static_bodies, left, top, right, bottom):
+        """
+        Gets the static bodies that may overlap the given bounds, in static_bodies order
+        """
+        self.update_static(static_bodies)
+        candidates = self.static_candidates(int(math.floor(left / self.cell_w)),
+                                            int(math.floor(right / self.cell_w)),
+                                            int(math.floor(top / self.cell_h)),
+                                            int(math.floor(bottom / self.cell_h)))
+        return [static_bodies[j] for j in candidates]
+
+
+class AdaptiveBroadphase(object):
+    """
+    Pairs the bodies with BruteForceBroadphase while there are few of them, and with
+    SpatialHashBroadphase otherwise. Once the bricks are kept in a LatticeIndex, only the
+    walls and the paddles are left in the static set, and pairing every dynamic body with
+    each of them is cheaper than hashing them. The spatial hash is used when there are
+    more than max_static static bodies (no lattice), or when dynamic bodies are paired
+    with each other and there are more than max_dynamic of them (multiball). Both
+    broadphases solve the same contacts (see SpatialHashBroadphase), so switching between
+    them from one step to the next does not change the simulation
+    """
+    def __init__(self, cell_w, cell_h, max_static=16, max_dynamic=24):
+        self.max_static = max_static
+        self.max_dynamic = max_dynamic
+        self.brute_force = BruteForceBroadphase()
+        self.spatial_hash = SpatialHashBroadphase(cell_w, cell_h)
 
-class PhysicsWorld:
+    def invalidate(self):
+        self.spatial_hash.invalidate()
+
+    def pairs(self, dynamic_bodies, static_bodies, lattice=None, dynamic_pairs=True):
+        if len(static_bodies) > self.max_static or (dynamic_pairs and len(dynamic_bodies) > self.max_dynamic):
+            return self.spatial_hash.pairs(dynamic_bodies, static_bodies, lattice, dynamic_pairs)
+        return self.brute_force.pairs(dynamic_bodies, static_bodies, lattice, dynamic_pairs)
+
+    def query_static(self, static_bodies, left, top, right, bottom):
+        """
+        Gets the static bodies that may overlap the given bounds, in static_bodies order
+        """
+        if len(static_bodies) > self.max_static:
+            return self.spatial_hash.query_static(static_bodies, left, top, right, bottom)
+        return static_bodies
+
+
+class LatticeIndex(object):
+    """
+    Grid-indexed store for static bodies laid out on a regular lattice, such as the
+    bricks of a map. Each lattice cell holds at most one body, so the bodies overlapping
+    a rectangle are found by looking up the few cells it covers, whatever the body count.
+    Only bodies of the given object type that sit exactly on the lattice are accepted.
+    """
+    def __init__(self, origin, pitch_x, pitch_y, object_type):
+        self.origin = origin
+        self.pitch_x = float(pitch_x)
+        self.pitch_y = float(pitch_y)
+        self.object_type = object_type
+        self.cells = {}
+        self.keys = {}
+        self.count = 0
+        # Rows that have held a body, so queries away from the bodies return at once
+        self.min_row = None
+        self.max_row = None
+
+    def cell_of(self, rect):
+        col = (rect.left() - self.origin.x) / self.pitch_x
+        row = (rect.top() - self.origin.y) / self.pitch_y
+        if abs(col - round(col)) > 0.0001 or abs(row - round(row)) > 0.0001:
+            return None
+        if rect.w > self.pitch_x or rect.h > self.pitch_y:
+            return None
+        return int(round(col)), int(round(row))
+
+    def insert(self, b):
+        """
+        Adds a body to the index. Returns False if the body does not fit in the lattice
+        """
+        if b.object_type != self.object_type:
+            return False
+        key = self.cell_of(b.rect)
+        if key is None or key in self.cells:
+            return False
+        # The insertion count keeps query results in registration order
+        self.cells[key] = (self.count, b)
+        self.keys[b] = key
+        self.count += 1
+        if self.min_row is None or key[1] < self.min_row:
+            self.min_row = key[1]
+        if self.max_row is None or key[1] > self.max_row:
+            self.max_row = key[1]
+        return True
+
+    def remove(self, b):
+        """
+        Removes a body from the index. Returns False if the body was not indexed
+        """
+        key = self.keys.pop(b, None)
+        if key is None:
+            return False
+        del self.cells[key]
+        return True
+
+    def query(self, rect):
+        """
+        Returns the indexed bodies whose lattice cells overlap the rectangle
+        """
+        return self.query_bounds(rect.left(), rect.top(), rect.right(), rect.bottom())
+
+    def query_bounds(self, left, top, right, bottom):
+        row0 = int(math.floor((top - self.origin.y) / self.pitch_y))
+        row1 = int(math.floor((bottom - self.origin.y) / self.pitch_y))
+        if self.min_row is None or row1 < self.min_row or row0 > self.max_row:
+            return []
+        col0 = int(math.floor((left - self.origin.x) / self.pitch_x))
+        col1 = int(math.floor((right - self.origin.x) / self.pitch_x))
+        found = []
+        for col in range(col0, col1 + 1):
+            for row in range(row0, row1 + 1):
+                entry = self.cells.get((col, row))
+                if entry is not None:
+                    found.append(entry)
+        found.sort()
+        return [b for seq, b in found]
+
+
+class PhysicsWorld(object):
+    """
+    Simulates the bodies in fixed steps of step_ms. In continuous mode, dynamic bodies are
+    swept against the static bodies (time of impact) instead of being moved a whole step
+    and separated afterwards, so large steps do not let fast bodies tunnel through bricks.
+    Contacts between dynamic bodies (ball/ball) are only solved if dynamic_collisions is set
+    """
     MAX_SPEED = 0.6
-    def __init__(self, step_ms):
+    MAX_SWEEPS = 4 # Maximum number of impacts solved per body and continuous step
+    SKIN = 0.0001 # Distance kept between a swept body and the body it hits
+    def __init__(self, step_ms, broadphase=None, continuous=False, dynamic_collisions=True):
         self.step_ms = step_ms   
-        self.remaining_ms = 0.0
-        self.bodies = []
-        self.list_call_backs = []
+        self.continuous = continuous
+        self.dynamic_collisions = dynamic_collisions
+        self.timestep = FixedTimestep(step_ms)
+        self.static_bodies = []
+        self.dynamic_bodies = []
+        self.slots = {} # Body -> its index in static_bodies or dynamic_bodies
+        self.lattice = None
+        # (type id, type id) -> [(callback, swapped)], where swapped callbacks expect the
+        # bodies in reverse order and the opposite normal
+        self.call_back_table = {}
+        self.broadphase = broadphase or BruteForceBroadphase()
+        self.profiler = None # Optional profiler.FrameProfiler timing the physics phases
+
+    def set_lattice(self, lattice):
+        """
+        Sets the LatticeIndex used for the static bodies that fit in it. Must be set
+        before adding those bodies
+        """
+        self.lattice = lattice
     
     def add_body(self, b):
-        self.bodies.append(b)
+        if b.is_static:
+            if self.lattice is None or not self.lattice.insert(b):
+                self.slots[b] = len(self.static_bodies)
+                self.static_bodies.append(b)
+                self.broadphase.invalidate()
+        else:
+            self.slots[b] = len(self.dynamic_bodies)
+            self.dynamic_bodies.append(b)
     
     def delete_body(self, b):
-        self.bodies.remove(b)  
+        if b.is_static:
+            if self.lattice is not None and self.lattice.remove(b):
+                return
+            self.remove_from(self.static_bodies, b)
+            self.broadphase.invalidate()
+        else:
+            self.remove_from(self.dynamic_bodies, b)
+
+    def remove_from(self, bodies, b):
+        # Removes b in O(1): the last body of the list takes its place
+        i = self.slots.pop(b)
+        last = bodies.pop()
+        if last is not b:
+            bodies[i] = last
+            self.slots[last] = i
+
+    def set_static(self, b, is_static):
+        """
+        Changes the static flag of a body, moving it to the matching body set
+        """
+        if b.is_static != is_static:
+            self.delete_body(b)
+            b.is_static = is_static
+            self.add_body(b)
+
+    def set_velocity(self, b, value):
+        """
+        Changes the speed of a body. The bodies in the world are changed through the world,
+        which may keep its own copy of their state (see physics_numpy)
+        """
+        b.set_velocity(value)
     
     class CallBack():
         def __init__(self, tb1, tb2, call_back):
@@ -89,10 +430,22 @@ class PhysicsWorld:
             self.call_back = call_back 
     
     def add_callback(self, call_back):
-        self.list_call_backs.append(call_back)  
+        """
+        Registers a collision callback. The handler and argument order for both body orders
+        are resolved here, so that collisions only do a dictionary lookup
+        """
+        t1 = object_type_id(call_back.tb1)
+        t2 = object_type_id(call_back.tb2)
+        self.call_back_table.setdefault((t1, t2), []).append((call_back.call_back, False))
+        if t1 != t2:
+            self.call_back_table.setdefault((t2, t1), []).append((call_back.call_back, True))
         
     def clear_bodies(self):
-        self.bodies = []        
+        self.static_bodies = []
+        self.dynamic_bodies = []
+        self.slots = {}
+        self.lattice = None
+        self.broadphase.invalidate()
     
     def collide(self, b1, b2):
         """
@@ -100,6 +453,12 @@ class PhysicsWorld:
         """
         if b1.is_static and b2.is_static:
             return False  
+        return self.overlap(b1, b2)
+
+    def overlap(self, b1, b2):
+        """
+        Tests whether the rectangles of two bodies overlap
+        """
         return not(
             b1.rect.left() >= b2.rect.right() or
             b1.rect.right() <= b2.rect.left() or
@@ -107,7 +466,8 @@ class PhysicsWorld:
             b1.rect.bottom() <= b2.rect.top())
     
     def solve_collision(self, b1, b2):
-        # Changes the direction of non-static moving bodies, and separates overlapping bodies
+        # Changes the direction of non-static moving bodies, and separates overlapping bodies.
+        # Returns the normal of b1 with respect to b2, the one the callbacks of (b1, b2) get
 
         def penetration(normal, movable_body, fixed_body):
             if normal.x < -0.0001:
@@ -122,76 +482,189 @@ class PhysicsWorld:
         if b1.is_static and not(b2.is_static):
             normal = self.calculate_normal(b2, b1)
             pen_distance = penetration(normal, b2, b1)           
-            b2.rect.position = vector.sum(b2.rect.position, vector.mul(normal, pen_distance))
-            b2.direction = vector.reflect(normal, b2.direction)
-            return normal 
+            b2.rect.position.iadd_scaled(normal, pen_distance)
+            b2.direction.reflect_inplace(normal)
+            return OPPOSITE_AXES[normal]
         elif not(b1.is_static) and b2.is_static:
             normal = self.calculate_normal(b1, b2)
             pen_distance = penetration(normal, b1, b2)
-            b1.rect.position = vector.sum(b1.rect.position, vector.mul(normal, pen_distance))
-            b1.direction = vector.reflect(normal, b1.direction)
+            b1.rect.position.iadd_scaled(normal, pen_distance)
+            b1.direction.reflect_inplace(normal)
             return normal  
         elif not(b1.is_static) and not(b2.is_static):
+            # Both bodies are moved apart half the penetration
             normal = self.calculate_normal(b1, b2)
-            normal_inv = vector.minus(normal)
+            normal_inv = OPPOSITE_AXES[normal]
             pen_distance = penetration(normal, b1, b2)
-            b1.rect.set_pos(vector.sum(b1.rect.position, vector.mul(normal, 0.5 * pen_distance)))
-            b1.direction = vector.reflect(normal, b1.direction)  
-            b2.rect.position = vector.sum(b2.rect.position, vector.mul(normal_inv, 0.5 * pen_distance))               
-            b2.direction = vector.reflect(normal_inv, b2.get_direction())
+            b1.rect.position.iadd_scaled(normal, 0.5 * pen_distance)
+            b1.direction.reflect_inplace(normal)
+            b2.rect.position.iadd_scaled(normal_inv, 0.5 * pen_distance)
+            b2.direction.reflect_inplace(normal_inv)
             return normal
         
     def calculate_normal(self, b1, b2):
         """
-        Calculates the normal of b1 with respect to b2
+        Calculates the normal of b1 with respect to b2. The result is one of the shared axis
+        vectors of the vector module and must not be modified
         """
-        normal_x = 0.0
-        normal_y = 0.0    
-        
-        # Difference between body centers
-        center_dir = vector.normalize(vector.sub(b1.rect.center(), b2.rect.center()))
+        # Normalized difference between body centers, computed without temporary vectors
+        dir_x = (b1.rect.position.x + b1.rect.w * 0.5) - (b2.rect.position.x + b2.rect.w * 0.5)
+        dir_y = (b1.rect.position.y + b1.rect.h * 0.5) - (b2.rect.position.y + b2.rect.h * 0.5)
+        m = math.sqrt(dir_x * dir_x + dir_y * dir_y)
+        if m > 0.0:
+            dir_x = dir_x / m
+            dir_y = dir_y / m
+        else:
+            dir_x = 0.0
+            dir_y = 0.0
 
         cos_threshold = b2.rect.w / math.sqrt(math.pow(b2.rect.h, 2) + math.pow(b2.rect.w, 2)) 
-        if vector.dot(center_dir, vector.Vector2(1, 0)) >= cos_threshold:
+        if dir_x >= cos_threshold:
             # b1 is at the right side of b2
-            normal_x = 1.0
-        elif vector.dot(center_dir, vector.Vector2(-1, 0)) >= cos_threshold:
+            return vector.RIGHT2
+        elif -dir_x >= cos_threshold:
             # b1 is at the left side of b2
-            normal_x = -1.0
-        elif vector.dot(center_dir, vector.Vector2(0, -1)) >= math.cos(math.pi * 0.5 - math.acos(cos_threshold)):
+            return vector.LEFT2
+        elif -dir_y >= math.cos(math.pi * 0.5 - math.acos(cos_threshold)):
             # b1 is above b2
-            normal_y = -1.0
+            return vector.UP2
         else:
             # b1 is below b2
-            normal_y = 1.0
-        
-        return vector.Vector2(normal_x, normal_y)
+            return vector.DOWN2
        
     def integrate(self):
         # Integrate body velocities
-        for b in self.bodies:
+        for b in self.dynamic_bodies:
             b.integrate(self.step_ms)    
     
     def detect_and_solve_collision(self):       
         # Detect and resolve collisions. Then, call collision callback functions.
-        for i in range(len(self.bodies) - 1):
-            for j in range(i + 1, len(self.bodies)):                
-                if self.collide(self.bodies[i], self.bodies[j]): 
-                    normal = self.solve_collision(self.bodies[i], self.bodies[j])   
-                    for c in self.list_call_backs:
-                        if self.bodies[i].object_type == c.tb1 and self.bodies[j].object_type == c.tb2:
-                            c.call_back(self.bodies[i], self.bodies[j], normal)
-                        elif self.bodies[j].object_type == c.tb1 and self.bodies[i].object_type == c.tb2:
-                            c.call_back(self.bodies[j], self.bodies[i], vector.minus(normal))                
+        # Only dynamic x (dynamic + static) pairs are generated, so static pairs never get here
+        pairs = self.broadphase.pairs(self.dynamic_bodies, self.static_bodies, self.lattice,
+                                      self.dynamic_collisions)
+        if self.profiler is not None:
+            pairs = self.profiler.counted('pairs', pairs)
+        for b1, b2 in pairs:
+            if self.overlap(b1, b2): 
+                self.resolve_contact(b1, b2)
+
+    def resolve_contact(self, b1, b2):
+        # Solves the collision of two overlapping bodies and calls their collision callbacks
+        if self.profiler is not None:
+            self.profiler.count('contacts')
+        self.call_callbacks(b1, b2, self.solve_collision(b1, b2))
+
+    def call_callbacks(self, b1, b2, normal):
+        handlers = self.call_back_table.get((b1.type_id, b2.type_id))
+        if handlers is not None:
+            if self.profiler is not None:
+                self.profiler.push('callbacks')
+            for call_back, swapped in handlers:
+                if swapped:
+                    call_back(b2, b1, OPPOSITE_AXES[normal])
+                else:
+                    call_back(b1, b2, normal)
+            if self.profiler is not None:
+                self.profiler.pop()
                     
-    def step_simulation(self, elapsed_time):
-        # Simulate a delta of time
-        self.remaining_ms += elapsed_time
-        step_count = int(self.remaining_ms / self.step_ms)
-        
-        for i in range(step_count):
+    def sweep(self, b, dx, dy, other):
+        """
+        Swept AABB test of body b moving by (dx, dy) against a fixed body. Returns the time
+        of impact as a fraction of the movement and the normal of b at the impact, or None
+        if they do not collide during the movement (or already overlap)
+        """
+        if dx > 0.0:
+            entry_x = (other.rect.left() - b.rect.right()) / dx
+            exit_x = (other.rect.right() - b.rect.left()) / dx
+        elif dx < 0.0:
+            entry_x = (other.rect.right() - b.rect.left()) / dx
+            exit_x = (other.rect.left() - b.rect.right()) / dx
+        elif b.rect.right() <= other.rect.left() or b.rect.left() >= other.rect.right():
+            return None
+        else:
+            entry_x = -float('inf')
+            exit_x = float('inf')
+
+        if dy > 0.0:
+            entry_y = (other.rect.top() - b.rect.bottom()) / dy
+            exit_y = (other.rect.bottom() - b.rect.top()) / dy
+        elif dy < 0.0:
+            entry_y = (other.rect.bottom() - b.rect.top()) / dy
+            exit_y = (other.rect.top() - b.rect.bottom()) / dy
+        elif b.rect.bottom() <= other.rect.top() or b.rect.top() >= other.rect.bottom():
+            return None
+        else:
+            entry_y = -float('inf')
+            exit_y = float('inf')
+
+        entry = max(entry_x, entry_y)
+        if entry < 0.0 or entry >= 1.0 or entry >= min(exit_x, exit_y):
+            return None
+        if entry_x > entry_y:
+            return entry, vector.LEFT2 if dx > 0.0 else vector.RIGHT2
+        return entry, vector.UP2 if dy > 0.0 else vector.DOWN2
+
+    def integrate_continuous(self):
+        # Moves the dynamic bodies up to their first impact against a static body, reflects
+        # them and keeps moving them for the rest of the step. A body hitting more than
+        # MAX_SWEEPS bodies in a step (wedged in a corner) stays at its last impact: the
+        # movement left is dropped rather than integrated without collisions
+        for b in list(self.dynamic_bodies):
+            remaining = 1.0
+            for i in range(self.MAX_SWEEPS):
+                distance = b.velocity * self.step_ms * remaining
+                dx = b.direction.x * distance
+                dy = b.direction.y * distance
+                if dx == 0.0 and dy == 0.0:
+                    break
+
+                # Bounds swept by the body
+                left = b.rect.left() + min(dx, 0.0)
+                top = b.rect.top() + min(dy, 0.0)
+                right = b.rect.right() + max(dx, 0.0)
+                bottom = b.rect.bottom() + max(dy, 0.0)
+                candidates = list(self.broadphase.query_static(self.static_bodies, left, top, right, bottom))
+                if self.lattice is not None:
+                    candidates.extend(self.lattice.query_bounds(left, top, right, bottom))
+                hit = None
+                for other in candidates:
+                    impact = self.sweep(b, dx, dy, other)
+                    if impact is not None and (hit is None or impact[0] < hit[0]):
+                        hit = impact[0], impact[1], other
+                if hit is None:
+                    b.rect.position.set(b.rect.position.x + dx, b.rect.position.y + dy)
+                    break
+
+                toi, normal, other = hit
+                b.rect.position.set(b.rect.position.x + dx * toi + normal.x * self.SKIN,
+                                    b.rect.position.y + dy * toi + normal.y * self.SKIN)
+                b.direction.reflect_inplace(normal)
+                if self.profiler is not None:
+                    self.profiler.count('contacts')
+                self.call_callbacks(b, other, normal)
+                remaining = remaining * (1.0 - toi)
+                    
+    def step(self):
+        # Simulate one step of step_ms
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.push('integrate')
+        if self.continuous:
+            self.integrate_continuous()
+        else:
             self.integrate()
-            self.detect_and_solve_collision()
+        if profiler is not None:
+            profiler.pop()
+            profiler.push('collision')
+        # In continuous mode this still solves dynamic/dynamic contacts and the static
+        # bodies that moved into a dynamic one, such as the paddle
+        self.detect_and_solve_collision()
+        if profiler is not None:
+            profiler.pop()
 
-        self.remaining_ms -= step_count * self.step_ms
+    def step_simulation(self, elapsed_time):
+        # Simulate a delta of time in whole steps, keeping the rest for the next call.
+        # The game runs its own fixed timestep and calls step() instead
+        for i in range(self.timestep.advance(elapsed_time)):
+            self.step()
         
\ No newline at end of file
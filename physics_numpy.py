@@ -0,0 +1,270 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+  
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import numpy
+
+
+import vector
+import physics
+
+
+class ArrayVector2(vector.Vector2):
+    """
+    Vector2 view of a row of one of the ArrayPhysicsWorld arrays
+    """
+    __slots__ = ('array', 'index')
+
+    def __init__(self, array, index):
+        self.array = array
+        self.index = index
+
+    def get_x(self):
+        return self.array.item(self.index, 0)
+
+    def set_x(self, value):
+        self.array[self.index, 0] = value
+
+    def get_y(self):
+        return self.array.item(self.index, 1)
+
+    def set_y(self, value):
+        self.array[self.index, 1] = value
+
+    x = property(get_x, set_x)
+    y = property(get_y, set_y)
+
+
+class ArrayPhysicsWorld(physics.PhysicsWorld):
+    """
+    PhysicsWorld backend keeping positions, sizes, directions, velocities and static flags
+    in contiguous NumPy arrays (one row per body). The position and direction vectors of
+    an added body are replaced by ArrayVector2 views of its row (and by plain vectors
+    again when it is removed), so entities keep using body.rect.position and
+    body.direction as before. Velocities and static flags must be changed through
+    set_velocity and set_static, which update both the body and its row.
+    Integration and the broadphase are vectorized: every dynamic body is tested against
+    every body while there are few of them; beyond MAX_DENSE_PAIRS pairs (e.g. multiball),
+    bodies are hashed into a uniform grid of cell_w x cell_h cells and dynamic bodies are
+    only tested against the bodies sharing one of their cells. Only the overlapping pairs
+    reach solve_collision and the collision callbacks, in the order of a test of every
+    dynamic body against every body.
+    There is no LatticeIndex: bricks are hashed and tested like any other body, so this
+    backend does not get the savings of the lattice on brick heavy maps.
+    Bodies are only kept in rows, which are swap-removed, so contacts are not resolved
+    in registration order.
+    """
+    INITIAL_CAPACITY = 256
+    MAX_DENSE_PAIRS = 4096 # Beyond this many candidate pairs, bodies are hashed into the grid
+    MAX_CELLS = 64 # Bodies covering more cells (e.g. the walls) are paired with every dynamic body
+
+    def __init__(self, step_ms, dynamic_collisions=True, cell_w=40, cell_h=20):
+        super(ArrayPhysicsWorld, self).__init__(step_ms, dynamic_collisions=dynamic_collisions)
+        self.cell_w = float(cell_w)
+        self.cell_h = float(cell_h)
+        self.rows = [] # Row index -> body
+        self.positions = numpy.zeros((self.INITIAL_CAPACITY, 2))
+        self.sizes = numpy.zeros((self.INITIAL_CAPACITY, 2))
+        self.directions = numpy.zeros((self.INITIAL_CAPACITY, 2))
+        self.velocities = numpy.zeros(self.INITIAL_CAPACITY)
+        self.static = numpy.ones(self.INITIAL_CAPACITY, dtype=bool)
+
+    def set_lattice(self, lattice):
+        # Bricks are hashed like any other body (see the class docstring)
+        pass
+
+    def grow(self):
+        capacity = 2 * len(self.velocities)
+        for field in ('positions', 'sizes', 'directions', 'velocities', 'static'):
+            old = getattr(self, field)
+            new = numpy.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, field, new)
+        for b in self.rows:
+            b.rect.position.array = self.positions
+            b.direction.array = self.directions
+
+    def add_body(self, b):
+        if len(self.rows) == len(self.velocities):
+            self.grow()
+        i = len(self.rows)
+        self.positions[i] = (b.rect.position.x, b.rect.position.y)
+        self.sizes[i] = (b.rect.w, b.rect.h)
+        self.directions[i] = (b.direction.x, b.direction.y)
+        self.velocities[i] = b.velocity
+        self.static[i] = b.is_static
+        self.rows.append(b)
+        self.slots[b] = i
+        b.rect.position = ArrayVector2(self.positions, i)
+        b.direction = ArrayVector2(self.directions, i)
+
+    def release(self, b):
+        # Gives a body its own position and direction vectors back
+        b.rect.position = vector.Vector2(b.rect.position.x, b.rect.position.y)
+        b.direction = vector.Vector2(b.direction.x, b.direction.y)
+
+    def delete_body(self, b):
+        i = self.slots.pop(b)
+        last = len(self.rows) - 1
+        self.release(b)
+        if i != last:
+            # Move the last row into the freed one
+            for field in ('positions', 'sizes', 'directions', 'velocities', 'static'):
+                array = getattr(self, field)
+                array[i] = array[last]
+            moved = self.rows[last]
+            self.rows[i] = moved
+            self.slots[moved] = i
+            moved.rect.position.index = i
+            moved.direction.index = i
+        self.rows.pop()
+
+    def set_static(self, b, is_static):
+        b.is_static = is_static
+        i = self.slots.get(b)
+        if i is not None:
+            self.static[i] = is_static
+
+    def set_velocity(self, b, value):
+        b.set_velocity(value)
+        i = self.slots.get(b)
+        if i is not None:
+            self.velocities[i] = b.velocity
+
+    def clear_bodies(self):
+        for b in self.rows:
+            self.release(b)
+        self.rows = []
+        super(ArrayPhysicsWorld, self).clear_bodies()
+
+    def overlap(self, b1, b2):
+        # Reads the rows of the bodies rather than going through their position views
+        i = self.slots.get(b1)
+        j = self.slots.get(b2)
+        if i is None or j is None:
+            return super(ArrayPhysicsWorld, self).overlap(b1, b2)
+        positions = self.positions
+        sizes = self.sizes
+        x1 = positions.item(i, 0)
+        x2 = positions.item(j, 0)
+        if x1 >= x2 + sizes.item(j, 0) or x1 + sizes.item(i, 0) <= x2:
+            return False
+        y1 = positions.item(i, 1)
+        y2 = positions.item(j, 1)
+        return not (y1 >= y2 + sizes.item(j, 1) or y1 + sizes.item(i, 1) <= y2)
+
+    def integrate(self):
+        n = len(self.rows)
+        dynamic = ~self.static[:n]
+        self.positions[:n][dynamic] += self.directions[:n][dynamic] * \
+                                       (self.velocities[:n][dynamic] * self.step_ms)[:, None]
+
+    def cell_ranges(self, left, top, right, bottom):
+        """
+        Gets the first grid cell column and row covered by each body, and its number of
+        columns and rows of cells
+        """
+        x0 = numpy.floor(left / self.cell_w).astype(numpy.int64)
+        y0 = numpy.floor(top / self.cell_h).astype(numpy.int64)
+        columns = numpy.floor(right / self.cell_w).astype(numpy.int64) - x0 + 1
+        rows = numpy.floor(bottom / self.cell_h).astype(numpy.int64) - y0 + 1
+        return x0, y0, columns, rows
+
+    def hash_cells(self, rows, x0, y0, columns, cell_rows):
+        """
+        Gets the grid cells covered by the bodies of the given rows, as two arrays: the
+        cell keys, and the row of the body covering each cell
+        """
+        x0, y0, columns, cell_rows = x0[rows], y0[rows], columns[rows], cell_rows[rows]
+        counts = columns * cell_rows
+        body = numpy.repeat(numpy.arange(len(rows)), counts)
+        # Index of each cell within the cells of its body, row by row
+        k = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        x = x0[body] + k // cell_rows[body]
+        y = y0[body] + k % cell_rows[body]
+        return (x << 32) + y, rows[body]
+
+    def candidate_pairs(self, dynamic_rows, left, top, right, bottom):
+        """
+        Gets the rows of the bodies to test for overlap, as two arrays (dynamic body rows,
+        body rows), with each pair of bodies at most once and in no particular order.
+        Without dynamic collisions, only the static bodies are paired with the dynamic ones
+        """
+        n = len(left)
+        if len(dynamic_rows) * n <= self.MAX_DENSE_PAIRS:
+            # Few bodies: every dynamic body against every body
+            return numpy.repeat(dynamic_rows, n), numpy.tile(numpy.arange(n), len(dynamic_rows))
+
+        # Each cell of a dynamic body against the bodies hashed in it
+        x0, y0, columns, cell_rows = ranges = self.cell_ranges(left, top, right, bottom)
+        large = columns * cell_rows > self.MAX_CELLS
+        pairable = numpy.ones(n, dtype=bool) if self.dynamic_collisions else self.static[:n]
+        keys, rows = self.hash_cells(numpy.nonzero(pairable & ~large)[0], *ranges)
+        order = numpy.argsort(keys)
+        keys = keys[order]
+        rows = rows[order]
+        dynamic_keys, dynamic_cell_rows = self.hash_cells(dynamic_rows, *ranges)
+        first = numpy.searchsorted(keys, dynamic_keys, 'left')
+        counts = numpy.searchsorted(keys, dynamic_keys, 'right') - first
+        k = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        i = numpy.repeat(dynamic_cell_rows, counts)
+        j = rows[numpy.repeat(first, counts) + k]
+        # Bodies sharing several cells are only paired in the first one (the top left cell
+        # of the intersection of their cell ranges)
+        shared = numpy.repeat(dynamic_keys, counts) == \
+                 (numpy.maximum(x0[i], x0[j]) << 32) + numpy.maximum(y0[i], y0[j])
+
+        # Large bodies are not hashed: they are candidates of every dynamic body
+        large_rows = numpy.nonzero(pairable & large)[0]
+        return (numpy.concatenate((i[shared], numpy.repeat(dynamic_rows, len(large_rows)))),
+                numpy.concatenate((j[shared], numpy.tile(large_rows, len(dynamic_rows)))))
+
+    def overlapping_pairs(self):
+        """
+        Gets the keys (dynamic body row * row count + body row) of the overlapping pairs of
+        bodies to solve, sorted as a test of every dynamic body against every body finds them
+        """
+        n = len(self.rows)
+        dynamic_rows = numpy.nonzero(~self.static[:n])[0]
+        if len(dynamic_rows) == 0:
+            return []
+        left = self.positions[:n, 0]
+        top = self.positions[:n, 1]
+        right = left + self.sizes[:n, 0]
+        bottom = top + self.sizes[:n, 1]
+
+        i, j = self.candidate_pairs(dynamic_rows, left, top, right, bottom)
+        overlap = ~((left[i] >= right[j]) | (right[i] <= left[j]) |
+                    (top[i] >= bottom[j]) | (bottom[i] <= top[j]))
+        # Keep each dynamic/dynamic pair once, and never pair a body with itself
+        if self.dynamic_collisions:
+            overlap &= self.static[j] | (j > i)
+        else:
+            overlap &= self.static[j]
+        return numpy.sort(i[overlap] * n + j[overlap]).tolist()
+
+    def detect_and_solve_collision(self):
+        # Bodies are looked up before solving, since callbacks may remove bodies and move rows
+        n = len(self.rows)
+        rows = self.rows
+        pairs = [(rows[key // n], rows[key % n]) for key in self.overlapping_pairs()]
+        if self.profiler is not None:
+            self.profiler.count('pairs', len(pairs))
+        for b1, b2 in pairs:
+            if self.overlap(b1, b2):
+                self.resolve_contact(b1, b2)
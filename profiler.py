@@ -0,0 +1,177 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import time
+
+
+import pygame
+
+
+from game_config import WHITE, BLACK, PROFILER_FONT_SIZE, PROFILER_OVERLAY_REFRESH
+from graphics import Graphics
+
+
+# Highest resolution wall clock available, in seconds
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class FrameProfiler(object):
+    """
+    Records the time spent in each phase of the last size frames, and counters of the work
+    done in them, into a ring buffer.
+    Phases are timed exclusively: push() pauses the running phase until the matching pop(),
+    so the time of the physics phases is not counted in the update phase that runs them.
+    """
+    PHASES = ('input', 'update', 'integrate', 'collision', 'callbacks', 'render', 'wait')
+    COUNTERS = ('pairs', 'contacts', 'blits')
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, size):
+        self.size = size
+        self.frames = 0 # Frames recorded, the last min(frames, size) are kept
+        self.times = dict((phase, [0.0] * size) for phase in self.PHASES)
+        self.counts = dict((counter, [0] * size) for counter in self.COUNTERS)
+        self.overlay_visible = False
+        self.overlay_surf = None
+        self.overlay_time = 0.0
+        self.begin_frame()
+
+    def begin_frame(self):
+        self.current_times = dict((phase, 0.0) for phase in self.PHASES)
+        self.current_counts = dict((counter, 0) for counter in self.COUNTERS)
+        self.stack = []
+        self.started = timer()
+
+    def end_frame(self):
+        while self.stack:
+            self.pop()
+        index = self.frames % self.size
+        for phase in self.PHASES:
+            self.times[phase][index] = self.current_times[phase] * 1000.0
+        for counter in self.COUNTERS:
+            self.counts[counter][index] = self.current_counts[counter]
+        self.frames += 1
+        self.begin_frame()
+
+    def push(self, phase):
+        now = timer()
+        if self.stack:
+            self.current_times[self.stack[-1]] += now - self.started
+        self.stack.append(phase)
+        self.started = now
+
+    def pop(self):
+        now = timer()
+        self.current_times[self.stack.pop()] += now - self.started
+        self.started = now
+
+    def switch(self, phase):
+        """
+        Ends the running phase and starts the next one
+        """
+        if self.stack:
+            self.pop()
+        self.push(phase)
+
+    def count(self, counter, amount=1):
+        self.current_counts[counter] += amount
+
+    def counted(self, counter, items):
+        """
+        Iterates items, counting them
+        """
+        for item in items:
+            self.current_counts[counter] += 1
+            yield item
+
+    def recorded(self, values):
+        return values[:min(self.frames, self.size)]
+
+    def percentiles(self, values):
+        """
+        Gets the PERCENTILES and the maximum of the recorded values (nearest rank)
+        """
+        values = sorted(self.recorded(values))
+        if not values:
+            return [0] * (len(self.PERCENTILES) + 1)
+        return [values[min(len(values) - 1, len(values) * p // 100)] for p in self.PERCENTILES] + \
+               [values[-1]]
+
+    def report_rows(self):
+        """
+        Gets the summary table of the recorded frames: a header and, for each phase, the
+        whole frame and each counter, its percentiles and maximum
+        """
+        rows = [['%d frames' % min(self.frames, self.size)] +
+                ['p%d' % p for p in self.PERCENTILES] + ['max']]
+        for phase in self.PHASES:
+            rows.append([phase + ' ms'] + ['%.2f' % v for v in self.percentiles(self.times[phase])])
+        frame_times = [sum(self.times[phase][i] for phase in self.PHASES) for i in range(self.size)]
+        rows.append(['frame ms'] + ['%.2f' % v for v in self.percentiles(frame_times)])
+        for counter in self.COUNTERS:
+            rows.append([counter] + ['%d' % v for v in self.percentiles(self.counts[counter])])
+        return rows
+
+    def report(self):
+        return ['%-14s' % row[0] + ''.join('%9s' % cell for cell in row[1:]) for row in self.report_rows()]
+
+    def dump(self, file_name):
+        """
+        Writes the recorded frames, oldest first, as CSV, followed by the summary table
+        """
+        recorded = min(self.frames, self.size)
+        first = self.frames - recorded
+        with open(file_name, 'w') as f:
+            f.write(','.join(('frame',) + self.PHASES + self.COUNTERS) + '\n')
+            for frame in range(first, self.frames):
+                index = frame % self.size
+                f.write(','.join([str(frame)] +
+                                 ['%.4f' % self.times[phase][index] for phase in self.PHASES] +
+                                 [str(self.counts[counter][index]) for counter in self.COUNTERS]) + '\n')
+            f.write('\n')
+            for line in self.report():
+                f.write('# ' + line + '\n')
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.overlay_surf = None
+
+    def draw_overlay(self, target):
+        """
+        Draws the summary table on the top left corner of target, rebuilding it every
+        PROFILER_OVERLAY_REFRESH ms. Gets the covered rectangle
+        """
+        now = timer()
+        if self.overlay_surf is None or (now - self.overlay_time) * 1000.0 > PROFILER_OVERLAY_REFRESH:
+            font = Graphics().get_font(PROFILER_FONT_SIZE)
+            rows = [[font.render(cell, False, WHITE) for cell in row] for row in self.report_rows()]
+            line_height = font.get_linesize()
+            first_width = max(row[0].get_width() for row in rows) + 8
+            cell_width = max(cell.get_width() for row in rows for cell in row[1:]) + 8
+            self.overlay_surf = pygame.Surface((first_width + cell_width * (len(rows[0]) - 1) + 4,
+                                                line_height * len(rows) + 4))
+            self.overlay_surf.fill(BLACK)
+            for i, row in enumerate(rows):
+                top = 2 + i * line_height
+                self.overlay_surf.blit(row[0], (2, top))
+                for j, cell in enumerate(row[1:]):
+                    # Right aligned columns
+                    self.overlay_surf.blit(cell, (2 + first_width + cell_width * (j + 1) - cell.get_width(), top))
+            self.overlay_time = now
+        return target.blit(self.overlay_surf, (0, 0))
@@ -0,0 +1,286 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import time
+
+
+import pygame
+
+
+import utils
+from game_config import STEP_TIME, STEP_TIME_INTEGRATE, MAX_SUBSTEPS, BALL_VELOCITY_X, BALL_VELOCITY_Y,\
+                        CONTINUOUS_COLLISION, STEP_TIME_INTEGRATE_CCD, PHYSICS_BACKEND, LEVEL_PACK,\
+                        BALL_COLLISIONS, MULTIBALL_ENABLED, MULTIBALL_BRICKS, MULTIBALL_SPLIT,\
+                        MULTIBALL_SPREAD, MULTIBALL_MAX_BALLS
+
+
+# A game session is replayed exactly by feeding GameLayer the same clock readings and input
+# events, since the game itself is deterministic. A session records, from the start of a game:
+#     + map: index of the first map
+#     + ticks: every clock reading (ms, from the first one) taken by the game loop
+#     + frames: number of get_events() calls of the game loop
+#     + events: [get_events() call, 'down' or 'up', key name] of the game keys
+#     + result: the game state at the end of the session (None if it was not finished)
+# Version 2: the game runs on a single fixed timestep, at most max_substeps steps per frame
+# Version 3: the header records the ball collision and multiball settings
+# Version 4: the header records the collision mode, the physics backend and the level pack, and
+# step_time_integrate is the physics step in effect
+SESSION_VERSION = 4
+
+# Recorded keys, by name, so sessions do not depend on pygame's key codes
+KEYS = {'left': pygame.K_LEFT, 'right': pygame.K_RIGHT, 'a': pygame.K_a, 'p': pygame.K_p}
+KEY_NAMES = dict((key, name) for name, key in KEYS.items())
+EVENT_TYPES = {'down': pygame.KEYDOWN, 'up': pygame.KEYUP}
+EVENT_TYPE_NAMES = dict((event_type, name) for name, event_type in EVENT_TYPES.items())
+
+
+def game_result(layer):
+    """
+    Gets the state of a game used to check a replay: status, map index, bricks left,
+    counters, paddle positions and balls (x, y, direction x, direction y, velocity)
+    """
+    return {'status': layer.game_status,
+            'map': layer.current_map.current_map,
+            'bricks': len(layer.bricks),
+            'stats': dict(layer.stats),
+            'paddles': [[p.body.rect.position.x, p.body.rect.position.y] for p in layer.paddles],
+            'balls': [[b.body.rect.position.x, b.body.rect.position.y,
+                       b.body.direction.x, b.body.direction.y, b.body.velocity] for b in layer.balls]}
+
+
+def level_pack_hash():
+    """
+    Gets the SHA-1 of the LEVEL_PACK file, or None when the built-in maps are played
+    """
+    if not LEVEL_PACK:
+        return None
+    with open(LEVEL_PACK, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def game_settings():
+    """
+    Gets the settings a session only replays as recorded with, by session header key
+    """
+    return {'step_time': STEP_TIME,
+            'step_time_integrate': STEP_TIME_INTEGRATE_CCD if CONTINUOUS_COLLISION else STEP_TIME_INTEGRATE,
+            'continuous_collision': CONTINUOUS_COLLISION,
+            'physics_backend': PHYSICS_BACKEND,
+            'level_pack': level_pack_hash(),
+            'max_substeps': MAX_SUBSTEPS,
+            'ball_velocity': [BALL_VELOCITY_X, BALL_VELOCITY_Y],
+            'ball_collisions': BALL_COLLISIONS,
+            'multiball': [MULTIBALL_ENABLED, MULTIBALL_BRICKS, MULTIBALL_SPLIT,
+                          MULTIBALL_SPREAD, MULTIBALL_MAX_BALLS]}
+
+
+def settings_mismatches(session):
+    """
+    Gets the settings that differ between a session and the current configuration, as
+    (header key, recorded value, current value) tuples
+    """
+    return [(key, session.get(key), value) for key, value in sorted(game_settings().items())
+            if session.get(key) != value]
+
+
+def new_session(map_index):
+    session = {'version': SESSION_VERSION,
+               'map': map_index,
+               'ticks': [],
+               'frames': 0,
+               'events': [],
+               'result': None}
+    session.update(game_settings())
+    return session
+
+
+def save_session(file_name, session):
+    """
+    Writes a session as JSON, gzip compressed if file_name ends with .gz
+    """
+    opener = gzip.open if file_name.endswith('.gz') else open
+    with opener(file_name, 'wt') as f:
+        json.dump(session, f, separators=(',', ':'))
+
+
+def load_session(file_name):
+    opener = gzip.open if file_name.endswith('.gz') else open
+    with opener(file_name, 'rt') as f:
+        session = json.load(f)
+    if session.get('version') != SESSION_VERSION:
+        raise ValueError('%s: unsupported session version %s' % (file_name, session.get('version')))
+    return session
+
+
+class RecordingClock(object):
+    """
+    Clock logging the readings of another clock into the current session
+    """
+    def __init__(self, recorder, clock):
+        self.recorder = recorder
+        self.clock = clock
+
+    def get_ticks(self):
+        ticks = self.clock.get_ticks()
+        self.recorder.record_ticks(ticks)
+        return ticks
+
+    def tick(self, fps):
+        self.clock.tick(fps)
+
+
+class RecordingInput(object):
+    """
+    Input source logging the game key events of another input source into the current session
+    """
+    def __init__(self, recorder, input_source):
+        self.recorder = recorder
+        self.input_source = input_source
+
+    def get_events(self):
+        events = self.input_source.get_events()
+        self.recorder.record_events(events)
+        return events
+
+
+class Recorder(object):
+    """
+    Records the sessions of a GameLayer, from initialize() to the end of the game, into
+    directory. Wraps the clock and the input source of the layer. A session interrupted
+    by quitting the game is saved, unfinished, on exit
+    """
+    def __init__(self, layer, directory):
+        self.layer = layer
+        self.directory = directory
+        self.session = None
+        self.first_ticks = None
+        self.calls = 0 # get_events() calls of the session
+        self.saved = 0
+        layer.clock = RecordingClock(self, layer.clock)
+        layer.input_source = RecordingInput(self, layer.input_source)
+        atexit.register(self.save)
+
+    def start(self):
+        """
+        Starts a session from the current map of the layer, saving the previous one if any
+        """
+        self.save()
+        self.session = new_session(self.layer.current_map.current_map)
+        self.first_ticks = None
+        self.calls = 0
+
+    def record_ticks(self, ticks):
+        if self.session is not None:
+            if self.first_ticks is None:
+                self.first_ticks = ticks
+            self.session['ticks'].append(ticks - self.first_ticks)
+
+    def record_events(self, events):
+        if self.session is None:
+            return
+        for event in events:
+            if event.type in EVENT_TYPE_NAMES and event.key in KEY_NAMES:
+                self.session['events'].append([self.calls, EVENT_TYPE_NAMES[event.type], KEY_NAMES[event.key]])
+        self.calls += 1
+
+    def finish(self):
+        """
+        Ends the session with the current state of the layer and saves it
+        """
+        if self.session is not None:
+            self.session['result'] = game_result(self.layer)
+            self.save()
+
+    def save(self):
+        if self.session is None:
+            return
+        self.session['frames'] = self.calls
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        file_name = 'session-%s-%d-%d.json.gz' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), self.saved)
+        save_session(os.path.join(self.directory, file_name), self.session)
+        self.session = None
+        self.saved += 1
+
+
+class ReplayFinished(Exception):
+    """
+    Raised when a replayed session has no more recorded input
+    """
+
+
+class ReplayClock(object):
+    """
+    Clock returning the recorded readings of a session. In real time, tick() waits until the
+    wall clock reaches the next reading, otherwise the game runs as fast as the CPU allows
+    """
+    def __init__(self, ticks, realtime=False):
+        self.ticks = ticks
+        self.next = 0
+        self.realtime = realtime
+        self.start_time = None
+
+    def get_ticks(self):
+        if self.next >= len(self.ticks):
+            raise ReplayFinished()
+        ticks = self.ticks[self.next]
+        self.next += 1
+        return ticks
+
+    def tick(self, fps):
+        if not self.realtime or self.next >= len(self.ticks):
+            return
+        if self.start_time is None:
+            self.start_time = pygame.time.get_ticks() - self.ticks[self.next - 1]
+        wait_time = self.start_time + self.ticks[self.next] - pygame.time.get_ticks()
+        if wait_time > 0:
+            pygame.time.wait(wait_time)
+
+
+class ReplayInput(object):
+    """
+    Input source returning the recorded events of a session, call by call. In real time,
+    it also checks whether the viewer closes the window or presses ESC
+    """
+    def __init__(self, events, calls, realtime=False):
+        self.events = events
+        self.calls = calls
+        self.call = 0
+        self.next = 0
+        self.realtime = realtime
+
+    def get_events(self):
+        if self.realtime:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYUP and event.key == pygame.K_ESCAPE):
+                    utils.terminate()
+        if self.call >= self.calls:
+            raise ReplayFinished()
+        events = []
+        while self.next < len(self.events) and self.events[self.next][0] == self.call:
+            call, event_type, key = self.events[self.next]
+            events.append(pygame.event.Event(EVENT_TYPES[event_type], key=KEYS[key]))
+            self.next += 1
+        self.call += 1
+        return events
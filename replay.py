@@ -0,0 +1,95 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import argparse
+import os
+import sys
+
+
+import pygame
+
+
+import game_layers
+import recording
+
+
+def replay_session(layer, session, realtime=False):
+    """
+    Replays a recorded session on a GameLayer, through its main loop. In real time the
+    game is rendered and runs at the recorded pace; otherwise it runs as fast as possible.
+    Returns the game result (see recording.game_result)
+    """
+    layer.recorder = None
+    layer.rendering = realtime
+    layer.initialize(None, session['map'])
+    layer.clock = recording.ReplayClock(session['ticks'], realtime)
+    layer.input_source = recording.ReplayInput(session['events'], session['frames'], realtime)
+    try:
+        while True:
+            layer.run()
+            if layer.game_status != layer.GAME_PAUSE_SCREEN:
+                break
+            # The pause screen resumes the game at once
+            layer.game_status = layer.GAME_LOOP
+    except recording.ReplayFinished:
+        pass
+    return recording.game_result(layer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays recorded game sessions')
+    parser.add_argument('sessions', nargs='+', help='session files (.json or .json.gz)')
+    parser.add_argument('--realtime', action='store_true',
+                        help='show the game at the recorded pace instead of replaying it headless')
+    args = parser.parse_args()
+
+    if not args.realtime:
+        # Without a window; the video driver must be selected before the display is created
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    layer = game_layers.GameLayer(None)
+
+    mismatches = 0
+    for file_name in args.sessions:
+        session = recording.load_session(file_name)
+        settings = recording.settings_mismatches(session)
+        if settings:
+            # The game would not play the same: not worth replaying
+            mismatches += 1
+            print('%s: MISMATCH (recorded with other settings)' % file_name)
+            for key, recorded, current in settings:
+                print('    %s: recorded %s, current %s' % (key, recorded, current))
+            continue
+        result = replay_session(layer, session, args.realtime)
+        if session['result'] is None:
+            print('%s: unfinished session replayed' % file_name)
+        elif result == session['result']:
+            print('%s: OK' % file_name)
+        else:
+            mismatches += 1
+            print('%s: MISMATCH' % file_name)
+            for key in sorted(result):
+                if result[key] != session['result'].get(key):
+                    print('    %s: recorded %s, replayed %s' % (key, session['result'].get(key), result[key]))
+    if mismatches:
+        print('%d of %d sessions did not replay as recorded' % (mismatches, len(args.sessions)))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import numpy
+import pygame
+
+
+from game_config import STEP_TIME, WINDOW_WIDTH, WINDOW_HEIGHT, BALL_WIDTH, BALL_HEIGHT
+from headless import Simulation
+
+
+class ArkanoidEnv(object):
+    """
+    Reinforcement learning environment (gym style) on top of a headless Simulation.
+        + reset() -> observation
+        + step(action) -> observation, reward, done, info
+    Actions: NOOP, LEFT, RIGHT or LAUNCH, held for frame_skip steps of STEP_TIME ms.
+    Observation: float32 vector with the paddle x, the first ball position, direction and
+    velocity and the fraction of bricks left, scaled to about [-1, 1]; or, if pixels is
+    set, the uint8 (height, width, 3) image of the scene drawn off-screen, scaled to
+    pixels = (width, height).
+    Reward: +1 per brick hit, +10 per map cleared, -1 when the ball is lost.
+    An episode ends when the ball is lost, the last map is cleared or after max_ms.
+    """
+    NOOP = 0
+    LEFT = 1
+    RIGHT = 2
+    LAUNCH = 3
+    ACTION_INPUTS = [(), (Simulation.LEFT,), (Simulation.RIGHT,), (Simulation.LAUNCH,)]
+    OBSERVATION_SIZE = 7
+
+    def __init__(self, frame_skip=4, pixels=None, max_ms=600000):
+        self.frame_skip = frame_skip
+        self.pixels = pixels
+        self.max_ms = max_ms
+        self.simulation = Simulation()
+        self.surface = None
+        self.state = None
+        self.brick_count = 1
+        self.bricks_hit = 0
+
+    def reset(self):
+        self.state = self.simulation.reset()
+        self.brick_count = max(1, self.state['bricks'])
+        self.bricks_hit = 0
+        return self.observe()
+
+    def step(self, action):
+        layer = self.simulation.layer
+        map_index = self.state['map']
+        inputs = self.ACTION_INPUTS[action]
+        for i in range(self.frame_skip):
+            self.state = self.simulation.step(inputs, STEP_TIME)
+            if self.simulation.done():
+                break
+
+        reward = float(layer.stats['bricks_hit'] - self.bricks_hit)
+        self.bricks_hit = layer.stats['bricks_hit']
+        if self.state['map'] != map_index:
+            reward += 10.0
+            self.brick_count = max(1, self.state['bricks'])
+        status = self.state['status']
+        if status == layer.GAME_WIN_SCREEN:
+            reward += 10.0
+        elif status == layer.GAME_EXIT:
+            reward -= 1.0
+        done = self.simulation.done() or self.state['time'] >= self.max_ms
+        return self.observe(), reward, done, {'time': self.state['time'], 'map': self.state['map']}
+
+    def observe(self):
+        if self.pixels is not None:
+            return self.render_pixels()
+        ball_x, ball_y, dir_x, dir_y, velocity = self.state['balls'][0]
+        return numpy.array([self.state['paddle'][0][0] / WINDOW_WIDTH * 2.0 - 1.0,
+                            (ball_x + BALL_WIDTH * 0.5) / WINDOW_WIDTH * 2.0 - 1.0,
+                            (ball_y + BALL_HEIGHT * 0.5) / WINDOW_HEIGHT * 2.0 - 1.0,
+                            dir_x,
+                            dir_y,
+                            velocity / self.simulation.layer.physics_world.MAX_SPEED,
+                            self.state['bricks'] / float(self.brick_count)], dtype=numpy.float32)
+
+    def render_pixels(self):
+        """
+        Draws the scene on an off-screen surface and returns it as a (height, width, 3) array
+        """
+        if self.surface is None:
+            self.surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.simulation.layer.draw_scene(self.surface)
+        surface = self.surface
+        if tuple(self.pixels) != (WINDOW_WIDTH, WINDOW_HEIGHT):
+            surface = pygame.transform.smoothscale(self.surface, self.pixels)
+        return pygame.surfarray.array3d(surface).transpose(1, 0, 2)
+
+
+class VectorArkanoidEnv(object):
+    """
+    Steps count independent ArkanoidEnv in lockstep, batching their observations,
+    rewards and done flags in NumPy arrays. Finished environments are reset automatically:
+    the observation returned for them is the first one of their next episode
+    """
+    def __init__(self, count, frame_skip=4, pixels=None, max_ms=600000):
+        self.envs = [ArkanoidEnv(frame_skip, pixels, max_ms) for i in range(count)]
+
+    def reset(self):
+        return numpy.stack([env.reset() for env in self.envs])
+
+    def step(self, actions):
+        observations = []
+        rewards = numpy.zeros(len(self.envs), dtype=numpy.float32)
+        dones = numpy.zeros(len(self.envs), dtype=bool)
+        infos = []
+        for i, env in enumerate(self.envs):
+            observation, rewards[i], dones[i], info = env.step(int(actions[i]))
+            if dones[i]:
+                info['final_observation'] = observation
+                observation = env.reset()
+            observations.append(observation)
+            infos.append(info)
+        return numpy.stack(observations), rewards, dones, infos
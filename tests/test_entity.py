@@ -0,0 +1,162 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import pytest
+
+
+import entity
+import game_layers
+import headless
+from game_config import MULTI_HIT_COLORS
+from vector import Vector2
+
+
+def test_registry_removal():
+    registry = entity.EntityRegistry(('brick', 'ball'))
+    bricks = registry.view('brick')
+    entities = [entity.DefaultBrick(i * 10.0, 0.0, 'red') for i in range(5)]
+    ball = entity.DefaultBall(0.0, 100.0)
+    for e in entities[:3] + [ball] + entities[3:]:
+        assert registry.add(e)
+    assert not registry.add(ball)
+    assert [e.entity_id for e in registry] == list(range(6))
+
+    # The last entity takes the place of the removed one
+    assert registry.remove(entities[1])
+    assert not registry.remove(entities[1])
+    assert list(registry) == [entities[0], entities[4], entities[2], ball, entities[3]]
+    assert list(bricks) == [entities[0], entities[4], entities[2], entities[3]]
+    assert registry.remove(ball)
+    assert list(registry) == [entities[0], entities[4], entities[2], entities[3]]
+    assert list(registry.view('ball')) == []
+
+    for items in (registry.entities, bricks):
+        for i, e in enumerate(items):
+            assert items.positions[e] == i
+            assert items[i] is e
+    for e in registry:
+        assert registry.get(e.entity_id) is e
+    assert registry.get(ball.entity_id) is None
+    assert registry.get(entities[1].entity_id) is None
+    assert entities[1] not in registry and len(registry) == 4
+
+
+def graphics_sprite(name):
+    return entity.graphics.get_sprite(name)
+
+
+def check_reset_body(e, x, y):
+    body = e.body
+    assert (body.rect.position.x, body.rect.position.y) == (x, y)
+    assert (body.direction.x, body.direction.y) == (0.0, 0.0)
+    assert body.velocity == 0.0
+    assert body.is_static
+    assert body.tag_ent is e
+
+
+def test_reset_brick():
+    color = MULTI_HIT_COLORS[0]
+    brick = entity.MultiHit(10.0, 20.0, color)
+    brick.apply_damage()
+    assert brick.sprite is not graphics_sprite(entity.brick_sprite_name(color))
+    brick.body.is_static = False
+    brick.body.direction.set(0.6, 0.8)
+    brick.body.set_velocity(0.3)
+
+    brick.reset(30.0, 40.0, color)
+    assert brick.health_points == 2
+    assert brick.sprite is graphics_sprite(entity.brick_sprite_name(color))
+    check_reset_body(brick, 30.0, 40.0)
+    # Damaged again like a new brick
+    assert not brick.apply_damage()
+    assert brick.sprite is graphics_sprite(entity.brick_sprite_name(color, True))
+    assert brick.apply_damage()
+
+    other_color = [c for c in entity.BRICKS_COLORS if c != color][0]
+    brick = entity.DefaultBrick(10.0, 20.0, color)
+    brick.apply_damage()
+    brick.reset(50.0, 60.0, other_color, 3)
+    assert brick.health_points == 3
+    assert brick.color == other_color
+    assert brick.sprite is graphics_sprite(entity.brick_sprite_name(other_color))
+    check_reset_body(brick, 50.0, 60.0)
+
+
+def test_reset_ball():
+    ball = entity.DefaultBall(10.0, 20.0, 2)
+    ball.body.is_static = False
+    ball.body.direction.set(0.6, -0.8)
+    ball.body.set_velocity(0.4)
+    ball.body.rect.position.iadd_scaled(Vector2(1.0, 1.0), 5.0)
+
+    ball.reset(30.0, 40.0)
+    assert ball.damage_points == 1
+    assert ball.sprite is graphics_sprite('ball')
+    check_reset_body(ball, 30.0, 40.0)
+
+
+def test_lost_ball_released_once(monkeypatch):
+    monkeypatch.setattr(game_layers, 'MULTIBALL_ENABLED', True)
+    monkeypatch.setattr(game_layers, 'MULTIBALL_SPLIT', 3)
+    simulation = headless.Simulation()
+    simulation.reset()
+    simulation.step()
+    simulation.step([headless.Simulation.LAUNCH])
+    layer = simulation.layer
+    layer.split_balls()
+    first, second, third = layer.balls
+    pool = layer.current_map.pool
+    released = []
+    release = pool.release
+    def record_release(e):
+        released.append(e)
+        release(e)
+    monkeypatch.setattr(pool, 'release', record_release)
+
+    # Reported twice in a step, released once
+    bottom_wall = [body for body in layer.bodies if body.object_type == 'bottom-wall'][0]
+    layer.on_ball_bottom_wall_collision(first.body, bottom_wall, None)
+    layer.on_ball_bottom_wall_collision(first.body, bottom_wall, None)
+    layer.on_ball_bottom_wall_collision(second.body, bottom_wall, None)
+    layer.remove_lost_balls()
+    assert released == [first, second]
+
+    # The pool hands each released ball out once
+    balls = [pool.acquire(entity.DefaultBall, 0.0, 0.0) for i in range(3)]
+    assert len(set(balls)) == 3
+
+
+def test_numpy_pooled_entities_leave_the_world(monkeypatch):
+    physics_numpy = pytest.importorskip('physics_numpy')
+    monkeypatch.setattr(game_layers, 'PHYSICS_BACKEND', 'numpy')
+    simulation = headless.Simulation()
+    simulation.reset()
+    layer = simulation.layer
+    pool = layer.current_map.pool
+    # The map prefetcher may reuse an entity as soon as it is released
+    released = []
+    release = pool.release
+    def check_release(entity):
+        released.append(entity)
+        assert not isinstance(entity.body.rect.position, physics_numpy.ArrayVector2)
+        assert not isinstance(entity.body.direction, physics_numpy.ArrayVector2)
+        release(entity)
+    monkeypatch.setattr(pool, 'release', check_release)
+    layer.clear_game()
+    assert released
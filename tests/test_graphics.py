@@ -0,0 +1,58 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import collections
+
+
+import pygame
+
+
+import graphics
+from game_config import TITLE_COLOR
+
+
+FONT_SIZE = 20
+
+
+def text_bytes(surf):
+    return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+
+def test_text_cache_budget(monkeypatch):
+    pygame.font.init()
+    g = graphics.Graphics()
+    monkeypatch.setattr(g, 'text_surfaces', collections.OrderedDict())
+    monkeypatch.setattr(g, 'text_surfaces_bytes', 0)
+    sizes = [text_bytes(g.get_font(FONT_SIZE).render(text, True, TITLE_COLOR)) for text in ('A', 'B', 'C')]
+    monkeypatch.setattr(graphics, 'TEXT_CACHE_BYTES', sum(sizes) - 1)
+
+    a = g.make_text_obj('A', TITLE_COLOR, FONT_SIZE)[0]
+    g.make_text_obj('B', TITLE_COLOR, FONT_SIZE)
+    assert g.make_text_obj('A', TITLE_COLOR, FONT_SIZE)[0] is a
+    # B is now the least recently used text, and makes room for C
+    g.make_text_obj('C', TITLE_COLOR, FONT_SIZE)
+    assert [key[0] for key in g.text_surfaces] == ['A', 'C']
+    assert g.text_surfaces_bytes == sizes[0] + sizes[2] <= graphics.TEXT_CACHE_BYTES
+
+    # Larger than the whole budget: rendered but not cached
+    surf, rect = g.make_text_obj('A much longer text', TITLE_COLOR, FONT_SIZE)
+    assert text_bytes(surf) > graphics.TEXT_CACHE_BYTES
+    assert rect.width == surf.get_width()
+    assert [key[0] for key in g.text_surfaces] == ['A', 'C']
+    assert g.make_text_obj('A much longer text', TITLE_COLOR, FONT_SIZE)[0] is not surf
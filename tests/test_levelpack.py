@@ -0,0 +1,98 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import pytest
+
+
+import levelpack
+from map import MapOne
+
+
+def write_level_pack(file_name, levels):
+    levelpack.write_pack(file_name, levels)
+    return levelpack.LevelPack(file_name)
+
+
+def test_round_trip(tmp_path):
+    level = levelpack.level_from_map(MapOne())
+    pack = write_level_pack(str(tmp_path / 'one.pack'), [level])
+    assert len(pack) == 1
+    assert pack.get_level(0).cells == level.cells
+    pack.close()
+
+
+def test_empty_pack(tmp_path):
+    with pytest.raises(ValueError):
+        levelpack.write_pack(str(tmp_path / 'empty.pack'), [])
+    file_name = str(tmp_path / 'empty.pack')
+    with open(file_name, 'wb') as f:
+        f.write(levelpack.HEADER.pack(levelpack.MAGIC, levelpack.VERSION, 0))
+    with pytest.raises(ValueError):
+        levelpack.LevelPack(file_name)
+
+
+def test_brick_without_health_points(tmp_path):
+    level = levelpack.level_from_map(MapOne())
+    kind, color, health_points = level.cells[0][0]
+    level.cells[0][0] = (kind, color, 0)
+    with pytest.raises(ValueError):
+        levelpack.encode_level(level)
+
+    # Written by hand: the first cell of the pack gets 0 health points
+    level.cells[0][0] = (kind, color, health_points)
+    file_name = str(tmp_path / 'zero.pack')
+    pack = write_level_pack(file_name, [level])
+    offset, size = levelpack.INDEX_ENTRY.unpack_from(pack.data, levelpack.HEADER.size)
+    pack.close()
+    with open(file_name, 'r+b') as f:
+        f.seek(offset + levelpack.LEVEL_HEADER.size)
+        f.write(levelpack.CELL.pack(kind, levelpack.BRICKS_COLORS.index(color), 0))
+    pack = levelpack.LevelPack(file_name)
+    with pytest.raises(ValueError):
+        pack.get_level(0)
+    pack.close()
+
+
+def test_corrupt_index(tmp_path):
+    levels = [levelpack.level_from_map(MapOne()), levelpack.level_from_map(MapOne())]
+    file_name = str(tmp_path / 'corrupt.pack')
+    pack = write_level_pack(file_name, levels)
+    entry = levelpack.HEADER.size + levelpack.INDEX_ENTRY.size
+    offset, size = levelpack.INDEX_ENTRY.unpack_from(pack.data, entry)
+    length = len(pack.data)
+    pack.close()
+
+    # The second level points past the end of the file, then the file is cut in its header
+    with open(file_name, 'r+b') as f:
+        f.seek(entry)
+        f.write(levelpack.INDEX_ENTRY.pack(length + 16, size))
+    pack = levelpack.LevelPack(file_name)
+    assert pack.get_level(0).cells == levels[0].cells
+    with pytest.raises(ValueError):
+        pack.get_level(1)
+    pack.close()
+
+    with open(file_name, 'r+b') as f:
+        f.seek(entry)
+        f.write(levelpack.INDEX_ENTRY.pack(offset, size))
+        f.truncate(offset + 2)
+    pack = levelpack.LevelPack(file_name)
+    with pytest.raises(ValueError):
+        pack.get_level(1)
+    pack.close()
@@ -0,0 +1,134 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import pytest
+
+
+import game_layers
+import headless
+import physics
+from game_config import WINDOW_HEIGHT, BALL_HEIGHT, BRICK_WIDTH, BRICK_HEIGHT
+from vector import Vector2
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    monkeypatch.setattr(game_layers, 'MULTIBALL_ENABLED', True)
+    monkeypatch.setattr(game_layers, 'MULTIBALL_SPLIT', 3)
+    simulation = headless.Simulation()
+    simulation.reset()
+    # The ball is put on the paddle, launched, and bounces off the paddle
+    simulation.step()
+    simulation.step([headless.Simulation.LAUNCH])
+    while simulation.layer.balls[0].body.direction.y > 0:
+        simulation.step()
+    return simulation
+
+
+def drop(ball):
+    # Puts a ball just above the bottom wall, falling
+    ball.body.rect.position.y = WINDOW_HEIGHT - BALL_HEIGHT * 0.5
+    ball.body.direction.vector_init(Vector2(0.0, 1.0))
+
+
+def test_split_balls_do_not_overlap(sim):
+    layer = sim.layer
+    layer.split_balls()
+    assert len(layer.balls) == 3
+    bodies = [ball.body for ball in layer.balls]
+    for i, b1 in enumerate(bodies):
+        for b2 in bodies[i + 1:]:
+            assert not layer.physics_world.overlap(b1, b2)
+
+
+def test_lost_balls(sim):
+    layer = sim.layer
+    layer.split_balls()
+    first, second, third = layer.balls
+    drop(first)
+    drop(third)
+    sim.step()
+    assert layer.stats['balls_lost'] == 2
+    assert list(layer.balls) == [second]
+    assert second.body in layer.physics_world.dynamic_bodies
+    assert layer.game_status == game_layers.GameLayer.GAME_LOOP
+
+    # The last ball ends the game, and is kept to be drawn
+    drop(second)
+    sim.step()
+    assert layer.stats['balls_lost'] == 3
+    assert list(layer.balls) == [second]
+    assert layer.game_status == game_layers.GameLayer.GAME_EXIT
+
+
+def test_ball_lost_twice(sim):
+    layer = sim.layer
+    layer.split_balls()
+    first, second, third = layer.balls
+    bottom_wall = [body for body in layer.bodies if body.object_type == 'bottom-wall'][0]
+    layer.on_ball_bottom_wall_collision(first.body, bottom_wall, None)
+    layer.on_ball_bottom_wall_collision(first.body, bottom_wall, None)
+    layer.on_ball_bottom_wall_collision(second.body, bottom_wall, None)
+    layer.remove_lost_balls()
+    assert layer.stats['balls_lost'] == 2
+    assert list(layer.balls) == [third]
+    assert layer.game_status == game_layers.GameLayer.GAME_LOOP
+
+
+def test_max_balls(sim, monkeypatch):
+    monkeypatch.setattr(game_layers, 'MULTIBALL_MAX_BALLS', 10)
+    layer = sim.layer
+    for i in range(4):
+        layer.split_balls()
+    assert len(layer.balls) == 10
+    assert len(layer.physics_world.dynamic_bodies) == 10
+
+
+def is_subsequence(items, sequence):
+    remaining = iter(sequence)
+    return all(any(item == other for other in remaining) for item in items)
+
+
+@pytest.mark.parametrize('broadphase', [physics.SpatialHashBroadphase, physics.AdaptiveBroadphase])
+@pytest.mark.parametrize('dynamic_pairs', [False, True])
+def test_spatial_hash_pairs(sim, monkeypatch, dynamic_pairs, broadphase):
+    monkeypatch.setattr(game_layers, 'MULTIBALL_MAX_BALLS', 200)
+    layer = sim.layer
+    for i in range(5):
+        layer.split_balls()
+        for j in range(5):
+            sim.step()
+    world = layer.physics_world
+    assert len(world.dynamic_bodies) > 100
+    spatial_hash = broadphase(BRICK_WIDTH, BRICK_HEIGHT)
+    overlaps = 0
+    # Bodies moved without solving contacts, so that they run into each other and into
+    # the static bodies
+    for i in range(20):
+        world.integrate()
+        brute_force_pairs = list(physics.BruteForceBroadphase().pairs(world.dynamic_bodies, world.static_bodies,
+                                                                      world.lattice, dynamic_pairs))
+        spatial_hash_pairs = list(spatial_hash.pairs(world.dynamic_bodies, world.static_bodies,
+                                                     world.lattice, dynamic_pairs))
+        # Same overlapping pairs, in the same order; only pairs that do not overlap are left out
+        assert is_subsequence(spatial_hash_pairs, brute_force_pairs)
+        overlapping = [pair for pair in brute_force_pairs if world.overlap(*pair)]
+        assert [pair for pair in spatial_hash_pairs if world.overlap(*pair)] == overlapping
+        overlaps += len(overlapping)
+    assert overlaps > 0
@@ -0,0 +1,143 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import pytest
+
+
+import game_layers
+import headless
+import physics
+import vector
+from game_config import BALL_WIDTH, BALL_HEIGHT, BRICK_WIDTH, BRICK_HEIGHT, BRICK_SPACING, STEP_TIME_INTEGRATE,\
+                        STEP_TIME_INTEGRATE_CCD
+from vector import ZERO2, Vector2
+
+
+PITCH_X = BRICK_WIDTH + BRICK_SPACING
+PITCH_Y = BRICK_HEIGHT + BRICK_SPACING
+
+
+def body(x, y, w, h, object_type, velocity=ZERO2, is_static=True):
+    return physics.Body(physics.Rect(Vector2(x, y), w, h), velocity, object_type, None, is_static)
+
+
+def test_lattice_pairs():
+    origin = Vector2(BRICK_SPACING, 60.0)
+    world = physics.PhysicsWorld(STEP_TIME_INTEGRATE, physics.BruteForceBroadphase())
+    world.set_lattice(physics.LatticeIndex(origin, PITCH_X, PITCH_Y, 'brick'))
+    bricks = [body(origin.x + col * PITCH_X, origin.y + row * PITCH_Y, BRICK_WIDTH, BRICK_HEIGHT, 'brick')
+              for row in range(4) for col in range(6)]
+    # Off the lattice: kept with the other static bodies
+    bricks.append(body(origin.x + 0.5 * PITCH_X, origin.y + 4 * PITCH_Y, BRICK_WIDTH, BRICK_HEIGHT, 'brick'))
+    for brick in bricks:
+        world.add_body(brick)
+    assert len(world.static_bodies) == 1
+
+    # Balls around the cell corners and edges, straddling up to four cells and the spacing
+    for col in range(7):
+        for row in range(6):
+            for dx, dy in ((-0.5, -0.5), (0.0, 0.0), (-1.0, 0.5), (0.5, -1.0)):
+                world.add_body(body(origin.x + col * PITCH_X + dx * BALL_WIDTH,
+                                    origin.y + row * PITCH_Y + dy * BALL_HEIGHT,
+                                    BALL_WIDTH, BALL_HEIGHT, 'ball', Vector2(0.1, 0.1), False))
+
+    def check():
+        pairs = list(world.broadphase.pairs(world.dynamic_bodies, world.static_bodies, world.lattice, False))
+        most = 0
+        for ball in world.dynamic_bodies:
+            expected = [brick for brick in bricks if world.overlap(ball, brick)]
+            found = [other for b, other in pairs if b is ball and world.overlap(ball, other)]
+            assert sorted(found, key=bricks.index) == expected
+            most = max(most, len(expected))
+        return pairs, most
+
+    pairs, most = check()
+    assert most == 4
+    # Bricks destroyed during the game leave the lattice
+    for brick in bricks[::3]:
+        world.delete_body(brick)
+        bricks.remove(brick)
+    pairs, most = check()
+    assert all(other in bricks for b, other in pairs)
+
+
+def test_swapped_callback():
+    world = physics.PhysicsWorld(STEP_TIME_INTEGRATE)
+    calls = []
+    world.add_callback(world.CallBack('ball', 'brick', lambda b1, b2, normal: calls.append((b1, b2, normal))))
+    ball = body(100.0, 100.0 + BRICK_HEIGHT - 2.0, BALL_WIDTH, BALL_HEIGHT, 'ball', Vector2(0.0, -0.1), False)
+    brick = body(100.0, 100.0, BRICK_WIDTH, BRICK_HEIGHT, 'brick')
+
+    # In registration order, with the normal of the ball
+    world.call_callbacks(ball, brick, vector.DOWN2)
+    # Swapped: (brick, ball) with the normal of the brick
+    world.call_callbacks(brick, ball, vector.UP2)
+    assert calls == [(ball, brick, vector.DOWN2), (ball, brick, vector.DOWN2)]
+
+    # Through a step, whichever order the broadphase gives the pair in
+    class SwappedBroadphase(physics.BruteForceBroadphase):
+        def pairs(self, dynamic_bodies, static_bodies, lattice=None, dynamic_pairs=True):
+            return [(b2, b1) for b1, b2 in physics.BruteForceBroadphase.pairs(self, dynamic_bodies, static_bodies,
+                                                                            lattice, dynamic_pairs)]
+    world.broadphase = SwappedBroadphase()
+    world.add_body(ball)
+    world.add_body(brick)
+    del calls[:]
+    world.detect_and_solve_collision()
+    assert calls == [(ball, brick, vector.DOWN2)]
+
+
+def test_shared_axes_are_not_modified(monkeypatch):
+    # The normals are the shared axis vectors: contacts of balls against every kind of body,
+    # and against each other, must leave them as they are
+    monkeypatch.setattr(game_layers, 'MULTIBALL_ENABLED', True)
+    monkeypatch.setattr(game_layers, 'MULTIBALL_BRICKS', 1)
+    monkeypatch.setattr(game_layers, 'BALL_COLLISIONS', True)
+    axes = [vector.RIGHT2, vector.LEFT2, vector.UP2, vector.DOWN2, vector.ZERO2]
+    values = [(axis.x, axis.y) for axis in axes]
+    simulation = headless.Simulation()
+    simulation.reset()
+    simulation.step()
+    simulation.step([headless.Simulation.LAUNCH])
+    for i in range(1000):
+        simulation.step()
+    assert simulation.layer.stats['bricks_hit'] > 0
+    assert simulation.layer.stats['paddle_bounces'] > 0
+    assert [(axis.x, axis.y) for axis in axes] == values
+
+
+@pytest.mark.parametrize('continuous', [False, True])
+def test_tunnelling(continuous):
+    # A ball just below a thin brick, moving up a step farther than their heights together
+    world = physics.PhysicsWorld(STEP_TIME_INTEGRATE_CCD, continuous=continuous)
+    hits = []
+    world.add_callback(world.CallBack('ball', 'brick', lambda ball, brick, normal: hits.append(normal)))
+    world.add_body(body(100.0, 100.0, BRICK_WIDTH, 4.0, 'brick'))
+    ball = body(100.0, 106.0, BALL_WIDTH, BALL_HEIGHT, 'ball', Vector2(0.0, -physics.PhysicsWorld.MAX_SPEED), False)
+    world.add_body(ball)
+    assert world.step_ms * ball.velocity > 4.0 + BALL_HEIGHT + 2.0
+    world.step()
+    if continuous:
+        assert hits == [vector.DOWN2]
+        assert ball.rect.top() >= 104.0
+        assert ball.direction.y > 0.0
+    else:
+        # Moved from below the brick to above it without touching it
+        assert hits == []
+        assert ball.rect.bottom() < 100.0
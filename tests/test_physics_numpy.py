@@ -0,0 +1,81 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import pytest
+
+
+import game_layers
+import headless
+
+
+@pytest.mark.parametrize('ball_collisions', [False, True])
+def test_numpy_hashed_pairs(monkeypatch, ball_collisions):
+    numpy = pytest.importorskip('numpy')
+    monkeypatch.setattr(game_layers, 'PHYSICS_BACKEND', 'numpy')
+    monkeypatch.setattr(game_layers, 'BALL_COLLISIONS', ball_collisions)
+    monkeypatch.setattr(game_layers, 'MULTIBALL_MAX_BALLS', 200)
+    simulation = headless.Simulation()
+    simulation.reset()
+    simulation.step()
+    simulation.step([headless.Simulation.LAUNCH])
+    layer = simulation.layer
+    for i in range(5):
+        layer.split_balls()
+        simulation.step()
+    world = layer.physics_world
+    n = len(world.rows)
+    assert numpy.count_nonzero(~world.static[:n]) * n > world.MAX_DENSE_PAIRS
+
+    overlaps = 0
+    for i in range(60):
+        world.integrate()
+        hashed = world.overlapping_pairs()
+        world.MAX_DENSE_PAIRS = n * n
+        dense = world.overlapping_pairs()
+        del world.MAX_DENSE_PAIRS
+        assert hashed == dense
+        overlaps += len(dense)
+    assert overlaps > 0
+
+
+def test_numpy_rows_follow_bodies(monkeypatch):
+    pytest.importorskip('numpy')
+    monkeypatch.setattr(game_layers, 'PHYSICS_BACKEND', 'numpy')
+    simulation = headless.Simulation()
+    simulation.reset()
+    simulation.step()
+    simulation.step([headless.Simulation.LAUNCH])
+    layer = simulation.layer
+    world = layer.physics_world
+    body = layer.balls[0].body
+    row = world.slots[body]
+    assert not world.static[row]
+    assert world.velocities[row] == body.velocity > 0.0
+
+    layer.serve_balls()
+    assert world.static[row]
+    assert world.velocities[row] == body.velocity == 0.0
+
+
+def test_numpy_without_continuous_collision(monkeypatch):
+    pytest.importorskip('numpy')
+    monkeypatch.setattr(game_layers, 'PHYSICS_BACKEND', 'numpy')
+    monkeypatch.setattr(game_layers, 'CONTINUOUS_COLLISION', True)
+    with pytest.raises(ValueError):
+        headless.Simulation()
@@ -0,0 +1,46 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import headless
+import recording
+
+
+def test_settings_mismatches(monkeypatch):
+    session = recording.new_session(0)
+    assert recording.settings_mismatches(session) == []
+
+    monkeypatch.setattr(recording, 'CONTINUOUS_COLLISION', True)
+    monkeypatch.setattr(recording, 'STEP_TIME_INTEGRATE_CCD', recording.STEP_TIME_INTEGRATE * 4)
+    keys = [key for key, recorded, current in recording.settings_mismatches(session)]
+    assert keys == ['continuous_collision', 'step_time_integrate']
+
+
+def test_level_pack_setting(monkeypatch, tmp_path):
+    session = recording.new_session(0)
+    file_name = tmp_path / 'levels.pack'
+    file_name.write_bytes(b'levels')
+    monkeypatch.setattr(recording, 'LEVEL_PACK', str(file_name))
+    assert [key for key, recorded, current in recording.settings_mismatches(session)] == ['level_pack']
+
+
+def test_simulations_are_not_recorded():
+    # Only main.py records the games played
+    simulation = headless.Simulation()
+    simulation.reset()
+    assert simulation.layer.recorder is None
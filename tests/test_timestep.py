@@ -0,0 +1,54 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+import headless
+from timestep import FixedTimestep
+from game_config import MAX_SUBSTEPS, STEP_TIME
+
+
+def test_capped_steps():
+    timestep = FixedTimestep(10, MAX_SUBSTEPS)
+    assert timestep.advance(10 * MAX_SUBSTEPS * 10 + 5) == MAX_SUBSTEPS
+    # The steps beyond the cap are dropped, the fraction of a step is kept
+    assert timestep.alpha() == 0.5
+    assert timestep.advance(5) == 1
+    assert timestep.alpha() == 0.0
+
+
+def test_uncapped_steps():
+    timestep = FixedTimestep(10, MAX_SUBSTEPS)
+    assert timestep.advance(10 * MAX_SUBSTEPS * 10 + 5, False) == MAX_SUBSTEPS * 10
+    assert timestep.alpha() == 0.5
+
+
+def test_simulation_runs_every_step():
+    simulation = headless.Simulation()
+    simulation.reset()
+    steps = []
+    step = simulation.layer.step
+    simulation.layer.step = lambda: steps.append(step())
+    simulation.step(dt=STEP_TIME * MAX_SUBSTEPS * 3)
+    assert len(steps) == MAX_SUBSTEPS * 3
+
+
+def test_alpha_range():
+    timestep = FixedTimestep(10, MAX_SUBSTEPS)
+    for elapsed in (0, 3, 7, 9.999, 10, 16.5, 33, 250, 0.25, 1000, 99.5):
+        timestep.advance(elapsed)
+        assert 0.0 <= timestep.alpha() < 1.0
@@ -0,0 +1,53 @@
+'''
+  Copyright (C) Ana Belen Sarabia Cobo <belensarabia@gmail.com>
+
+  This program is free software; you can redistribute it and/or 
+  modify it under the terms of the GNU General Public License
+  Version 3 as published by the Free Software Foundation
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+  
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor,
+  Boston, MA 02110-1301, USA.
+'''
+
+
+class FixedTimestep(object):
+    """
+    Fixed timestep scheduler: accumulates the elapsed time and tells how many steps of
+    step_ms to run for it. At most max_steps are run per call; the time beyond them is
+    dropped, so after a stall the game slows down instead of running more and more steps
+    to catch up, unless advance() is told not to cap the steps. The time left, a fraction
+    of a step, is kept for the next call
+    """
+    def __init__(self, step_ms, max_steps=None):
+        self.step_ms = step_ms
+        self.max_steps = max_steps
+        self.reset()
+
+    def reset(self):
+        self.accumulator = 0.0
+
+    def advance(self, elapsed_ms, capped=True):
+        """
+        Adds elapsed_ms to the accumulated time and gets the number of steps to run, at
+        most max_steps if capped
+        """
+        self.accumulator += elapsed_ms
+        steps = int(self.accumulator / self.step_ms)
+        if capped and self.max_steps is not None and steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = self.accumulator % self.step_ms + steps * self.step_ms
+        self.accumulator -= steps * self.step_ms
+        return steps
+
+    def alpha(self):
+        """
+        Gets the time left as a fraction of a step, to interpolate between the last two steps
+        """
+        return self.accumulator / self.step_ms
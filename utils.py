@@ -18,6 +18,9 @@
 
 
 import sys
+
+
+import pygame
   
     
 def terminate():
@@ -29,3 +32,69 @@ def terminate():
 
 def clamp(value, min_value, max_value):
     return min(max_value, max(min_value, value))
+
+
+class RealTimeClock(object):
+    """
+    Wall clock of the game loop: time in ms since pygame.init(), and frame rate limiting
+    """
+    def __init__(self):
+        self.fps_clock = pygame.time.Clock()
+
+    def get_ticks(self):
+        return pygame.time.get_ticks()
+
+    def tick(self, fps):
+        self.fps_clock.tick(fps)
+
+
+class IndexedList(object):
+    """
+    List with O(1) membership test, append and removal. Removing an item moves the last
+    item into its place, so the order of the items is not kept
+    """
+    def __init__(self):
+        self.items = []
+        self.positions = {} # Item -> its index in items
+
+    def append(self, item):
+        """
+        Appends an item if it is not in the list. Returns whether it was appended
+        """
+        if item in self.positions:
+            return False
+        self.positions[item] = len(self.items)
+        self.items.append(item)
+        return True
+
+    def remove(self, item):
+        """
+        Removes an item if it is in the list. Returns whether it was removed
+        """
+        i = self.positions.pop(item, None)
+        if i is None:
+            return False
+        last = self.items.pop()
+        if last is not item:
+            self.items[i] = last
+            self.positions[last] = i
+        return True
+
+    def clear(self):
+        self.items = []
+        self.positions = {}
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __add__(self, other):
+        return self.items + list(other)
@@ -19,7 +19,13 @@
 
 import math
 
-class Vector2:
+class Vector2(object):
+    """
+    2D vector. The module functions return new vectors; the methods below modify the
+    vector in place and are meant for the per-step physics code, which must not allocate
+    """
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -31,6 +37,33 @@ class Vector2:
         self.x = v.x
         self.y = v.y
 
+    def set(self, x, y):
+        self.x = x
+        self.y = y
+
+    def iadd_scaled(self, v, scalar):
+        # self += v * scalar
+        self.x = self.x + v.x * scalar
+        self.y = self.y + v.y * scalar
+
+    def normalize_inplace(self):
+        m = magnitude(self)
+        if m > 0.0:
+            self.x = self.x / m
+            self.y = self.y / m
+        else:
+            self.x = 0.0
+            self.y = 0.0
+
+    def reflect_inplace(self, normal):
+        self.iadd_scaled(normal, abs(2.0 * dot(self, normal)))
+        self.normalize_inplace()
+
+    def rotate_inplace(self, angle):
+        cosA = math.cos(angle)
+        sinA = math.sin(angle)
+        self.x, self.y = self.x * cosA - self.y * sinA, self.x * sinA + self.y * cosA
+
 def sum(v1, v2):
     return Vector2(v1.x + v2.x, v1.y + v2.y)
 
@@ -64,3 +97,9 @@ def rotate(v, angle):
     return Vector2(v.x * cosA - v.y * sinA, v.x * sinA + v.y * cosA)
 
 ZERO2 = Vector2(0.0, 0.0)
+
+# Shared axis vectors (screen coordinates, y grows downwards). Never modify them in place
+RIGHT2 = Vector2(1.0, 0.0)
+LEFT2 = Vector2(-1.0, 0.0)
+UP2 = Vector2(0.0, -1.0)
+DOWN2 = Vector2(0.0, 1.0)